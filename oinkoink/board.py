@@ -1,9 +1,13 @@
+from oinkoink import kernels
 from oinkoink.utils import Connect4Stats as info
 from oinkoink.utils import Result, Side
 
-from copy import copy, deepcopy
+from contextlib import contextmanager
+from copy import copy
+from multiprocessing import Pool
 import numpy as np
-from typing import Set
+import struct
+from typing import Iterator, List, Optional, Sequence, Set, Tuple
 
 
 WIDTH = info.width
@@ -30,14 +34,33 @@ BITMASK = np.flipud(np.transpose(np.reshape(
 #  0  7 14 21 28 35 42  BOTTOM
 HALF = int(WIDTH / 2)
 SHIFT = (WIDTH - 1) * H1
+# lowest and highest playable cell of each column, and all of its cells
+COLUMN_BOTTOM = [1 << (H1 * i) for i in range(WIDTH)]
+COLUMN_TOP = [1 << (H1 * i + HEIGHT - 1) for i in range(WIDTH)]
+COLUMN = [((1 << HEIGHT) - 1) << (H1 * i) for i in range(WIDTH)]
+# every playable cell, i.e. ALL1 without the TOP row
+BOARD_MASK = ALL1 ^ TOP
+# bit index of each cell of the (HEIGHT, WIDTH) arrays used by to_array
+BIT_INDEX = np.flipud(np.arange(SIZE1).reshape(WIDTH, H1).T)[1:, :]
+# shifts checked for 4 in a row: vertical, horizontal and both diagonals
+DIRECTIONS = (1, H1, HEIGHT, H2)
+# a Board serialised as its little endian position and mask
+RECORD = struct.Struct('<QQ')
 
 
 class Board():
+    # position holds the pieces of the player to move, mask holds all pieces
+    # key = position + mask identifies a position in one int: the sum can't
+    # carry out of a column and the column's height decides its range
+    # windows holds the 4 cell windows each side could still win with
+    __slots__ = ('position', 'mask', 'key', 'age', 'windows', 'result')
+
     def __init__(self):
-        self.color = np.zeros((2,), dtype=np.int64)
+        self.position = 0
+        self.mask = 0
+        self.key = 0
         self.age = 0
-        self.height = np.array([H1 * i for i in range(WIDTH)],
-                               dtype=np.int64)
+        self.windows = EMPTY_WINDOWS
         self.result = None
 
     @classmethod
@@ -45,42 +68,94 @@ class Board():
                     o_pieces,
                     x_pieces):
         board = cls()
-        board.color[0] = np.dot(np.concatenate(o_pieces),
-                                np.concatenate(BITMASK))
-        board.color[1] = np.dot(np.concatenate(x_pieces),
-                                np.concatenate(BITMASK))
-        pieces = o_pieces + x_pieces
-        board.age = np.sum(pieces)
-        for i in range(WIDTH):
-            board.height[i] = board.height[i] + np.count_nonzero(pieces[:, i])
-        if board._check_terminal_position(board.color[0]):
+        o_color = int(np.dot(np.concatenate(o_pieces),
+                             np.concatenate(BITMASK)))
+        x_color = int(np.dot(np.concatenate(x_pieces),
+                             np.concatenate(BITMASK)))
+        board.mask = o_color | x_color
+        board.age = popcount(board.mask)
+        board.position = o_color if board.age % 2 == 0 else x_color
+        board.key = board.position + board.mask
+        board._reset_windows()
+        if board._check_terminal_position(o_color):
             board.result = Result.o_win
-        elif board._check_terminal_position(board.color[1]):
+        elif board._check_terminal_position(x_color):
             board.result = Result.x_win
-        elif board.age == SIZE:
+        elif not board.windows:
             board.result = Result.draw
         return board
 
+    @classmethod
+    def from_bitboards(cls, position: int, mask: int):
+        board = cls()
+        board.position = position
+        board.mask = mask
+        board.key = position + mask
+        board.age = popcount(mask)
+        board._reset_windows()
+        if board._check_terminal_position(position ^ mask):
+            board.result = Result(board.age % 2)
+        elif not board.windows:
+            board.result = Result.draw
+        return board
+
+    @classmethod
+    def from_key(cls, key: int):
+        mask = 0
+        for i in range(WIDTH):
+            # each column of key is 2 ** height - 1 + the pieces of position
+            height = (((key >> (H1 * i)) & COL1) + 1).bit_length() - 1
+            mask |= ((1 << height) - 1) << (H1 * i)
+        return cls.from_bitboards(key - mask, mask)
+
+    @classmethod
+    def from_record(cls, record: bytes):
+        return cls.from_bitboards(*RECORD.unpack(record))
+
+    @classmethod
+    def from_moves(cls, moves: str):
+        """Play a string of 1 based column digits, e.g. "4453" """
+        board = cls()
+        for char in moves:
+            move = ord(char) - ord('1')
+            if board.result is not None or not 0 <= move < WIDTH \
+                    or not board._isplayable(move):
+                raise ValueError('Invalid move {} in {}'.format(char, moves))
+            board.make_move(move)
+        return board
+
+    def to_record(self) -> bytes:
+        """position and mask packed into RECORD.size (16) bytes"""
+        return RECORD.pack(self.position, self.mask)
+
+    @property
+    def color(self):
+        if self.age & 1:
+            return self.position ^ self.mask, self.position
+        return self.position, self.position ^ self.mask
+
+    @property
+    def height(self):
+        return [H1 * i + popcount((self.mask >> (H1 * i)) & COL1)
+                for i in range(WIDTH)]
+
     @property
     def o_pieces(self):
-        return np.flipud(np.reshape(
-            np.array([(self.color[0] >> i) % 2
-                      for i in range(SIZE1)],
-                     dtype=np.bool_),
-            (H1, WIDTH), order='F')[0:HEIGHT, :])
+        return unpack_pieces(self.color[0])
 
     @property
     def x_pieces(self):
-        return np.flipud(np.reshape(
-            np.array([(self.color[1] >> i) % 2
-                      for i in range(SIZE1)],
-                     dtype=np.bool_),
-            (H1, WIDTH), order='F')[0:HEIGHT, :])
+        return unpack_pieces(self.color[1])
 
     @property
     def pieces(self):
         return self.o_pieces, self.x_pieces
 
+    @property
+    def canonical_key(self):
+        """The same key for a position and its mirror image"""
+        return min(self.key, self.flip_color(self.key))
+
     @property
     def player_to_move(self):
         return Side(self.age % 2)
@@ -89,12 +164,13 @@ class Board():
     def valid_moves(self):
         if self.result is not None:
             return set()
-        return set([i for i in range(WIDTH) if self._isplayable(i)])
+        return set([i for i in range(WIDTH)
+                    if self.mask & COLUMN_TOP[i] == 0])
 
     @property
     def symmetrical(self):
-        return self.is_symmetrical(self.color[0]) and \
-            self.is_symmetrical(self.color[1])
+        return self.is_symmetrical(self.position) and \
+            self.is_symmetrical(self.mask)
 
     def is_symmetrical(self, pieces):
         for i in range(HALF):
@@ -113,16 +189,13 @@ class Board():
         return True
 
     def create_fliplr(self):
-        new_board = self.__class__()
-        new_board.color[0] = self.flip_color(self.color[0])
-        new_board.color[1] = self.flip_color(self.color[1])
+        new_board = self.__class__.__new__(self.__class__)
+        new_board.position = self.flip_color(self.position)
+        new_board.mask = self.flip_color(self.mask)
+        new_board.key = new_board.position + new_board.mask
         new_board.age = self.age
-        base_height = np.array([H1 * i for i in range(WIDTH)],
-                               dtype=np.int64)
-        height_incr = self.height - base_height
-        height_incr = np.flip(height_incr)
-        new_board.height = base_height + height_incr
-        new_board.result = deepcopy(self.result)
+        new_board._reset_windows()
+        new_board.result = self.result
         return new_board
 
     def flip_color(self, pieces):
@@ -145,30 +218,138 @@ class Board():
         return new_pieces
 
     def to_array(self):
-        o_pieces, x_pieces = self.pieces
-
-        to_move = np.ones(o_pieces.shape, dtype=np.uint8) if \
-                      self.age % 2 == 0 else \
-                      np.zeros(x_pieces.shape, dtype=np.uint8)
-
-        return np.stack([to_move, o_pieces, x_pieces])
+        o_color, x_color = self.color
+        return encode_planes([o_color], [x_color], [self.age],
+                             out=np.empty((1, 3, HEIGHT, WIDTH),
+                                          dtype=np.uint8))[0]
 
     def to_int_tuple(self):
-        # FIXME: can I really have 1 value repr?
-        return self.color[0], self.color[1]
+        return self.color
 
     def make_move(self, move):
-        self.color[self.age & 1] = \
-            self.color[self.age & 1] ^ (1 << self.height[move])
-        self.height[move] = self.height[move] + 1
-        winner = self._check_terminal_position(self.color[self.age & 1])
+        piece = (self.mask + COLUMN_BOTTOM[move]) & ~self.mask
+        # switch position to the opponent, then add the piece to the mask
+        self.position ^= self.mask
+        self.mask |= piece
+        self.key = self.position + self.mask
+        # the opponent can no longer win with any window through piece
+        self.windows &= CLOSE_WINDOWS[self.age & 1][piece]
         self.age += 1
-        if winner:
+        # the player that moved now has the pieces position ^ mask
+        if self._check_terminal_position(self.position ^ self.mask):
             self.result = Result(self.age % 2)
-        elif self.age == SIZE:
+        elif not self.windows:
+            # nobody can make 4 in a row any more, including a full board
             self.result = Result.draw
         return self.result
 
+    def unmake_move(self, move, windows=None):
+        """Undo make_move(move), which must have been the last move in
+        that column. windows, the value before the move, restores the open
+        windows at once, otherwise they are rebuilt from the pieces"""
+        # next empty cell of the column, shifted down onto its top piece
+        top = ((self.mask + COLUMN_BOTTOM[move]) & ~self.mask) >> 1
+        self.mask ^= top
+        self.position ^= self.mask
+        self.key = self.position + self.mask
+        self.age -= 1
+        if windows is None:
+            self._reset_windows()
+        else:
+            self.windows = windows
+        self.result = None
+
+    @contextmanager
+    def move_stack(self, *moves):
+        """Play moves for the duration of a with block, then undo them"""
+        played = []
+        try:
+            for move in moves:
+                windows = self.windows
+                self.make_move(move)
+                played.append((move, windows))
+            yield self
+        finally:
+            for move, windows in reversed(played):
+                self.unmake_move(move, windows)
+
+    def children(self) -> List[Tuple[int, int, bool, bool]]:
+        """(move, key, win, draw) of each playable column, where win means
+        the player to move wins by playing it, from one winning_cells call
+        rather than a copy and terminal check per child"""
+        if self.result is not None:
+            return []
+        possible = self._possible()
+        wins = winning_cells(self.position, self.mask) & possible
+        # every child's key, less its new piece
+        key = (self.position ^ self.mask) + self.mask
+        close = CLOSE_WINDOWS[self.age & 1]
+        children = []
+        for move in range(WIDTH):
+            piece = possible & COLUMN[move]
+            if piece:
+                win = (wins & piece) != 0
+                draw = not win and not (self.windows & close[piece])
+                children.append((move, key + piece, win, draw))
+        return children
+
+    def child(self, move: int, win: bool, draw: bool):
+        """The board after move, given its entry of children()"""
+        board = self.__class__.__new__(self.__class__)
+        piece = (self.mask + COLUMN_BOTTOM[move]) & ~self.mask
+        board.position = self.position ^ self.mask
+        board.mask = self.mask | piece
+        board.key = board.position + board.mask
+        board.age = self.age + 1
+        board.windows = self.windows & CLOSE_WINDOWS[self.age & 1][piece]
+        if win:
+            board.result = Result(board.age % 2)
+        elif draw:
+            board.result = Result.draw
+        else:
+            board.result = None
+        return board
+
+    def winning_moves(self):
+        """Columns where the player to move completes 4 in a row"""
+        return cell_columns(
+            winning_cells(self.position, self.mask) & self._possible())
+
+    def opponent_threats(self):
+        """Columns where the opponent would win if they moved now"""
+        return cell_columns(
+            winning_cells(self.position ^ self.mask, self.mask)
+            & self._possible())
+
+    def non_losing_moves(self):
+        """Columns that don't let the opponent win on their next move"""
+        return cell_columns(self._non_losing_cells()) | self.winning_moves()
+
+    def forced_move(self):
+        """A winning move if there is one, otherwise the only move that
+        doesn't lose immediately, otherwise None"""
+        if self.result is not None:
+            return None
+        wins = winning_cells(self.position, self.mask) & self._possible()
+        if wins:
+            return lowest_column(wins)
+        cells = self._non_losing_cells()
+        if cells and cells & (cells - 1) == 0:
+            return lowest_column(cells)
+        return None
+
+    def _reset_windows(self):
+        o_color, x_color = self.color
+        self.windows = open_windows(x_color) | \
+            (open_windows(o_color) << WINDOW_BITS)
+
+    # cells that can be played into this move
+    def _possible(self):
+        return possible_cells(self.mask)
+
+    def _non_losing_cells(self):
+        return non_losing_cells(self.position, self.mask)
+
     # return whether newboard includes a win
     def _check_terminal_position(self, newboard):
         y = newboard & (newboard >> HEIGHT)
@@ -185,22 +366,36 @@ class Board():
 
     # return whether columns col has room
     def _isplayable(self, col):
-        return (self.color[self.age & 1] | (1 << self.height[col])) & TOP == 0
+        return self.mask & COLUMN_TOP[col] == 0
 
     def __copy__(self):
-        new_board = self.__class__()
-        new_board.color = deepcopy(self.color)
+        new_board = self.__class__.__new__(self.__class__)
+        new_board.position = self.position
+        new_board.mask = self.mask
+        new_board.key = self.key
         new_board.age = self.age
-        new_board.height = deepcopy(self.height)
-        new_board.result = deepcopy(self.result)
+        new_board.windows = self.windows
+        new_board.result = self.result
         return new_board
 
+    def __reduce__(self):
+        # pickle as a fixed size record, everything else is recalculated
+        return _board_from_record, (self.to_record(),)
+
+    def __setstate__(self, state):
+        # pickles of the old Board hold its __dict__: color, the pieces of
+        # o and x, age, height and result
+        o_color, x_color = (int(c) for c in state['color'])
+        board = Board.from_bitboards(
+            x_color if state['age'] % 2 else o_color, o_color | x_color)
+        for slot in Board.__slots__:
+            setattr(self, slot, getattr(board, slot))
+
     def __eq__(self, obj):
-        return isinstance(obj, Board) \
-            and np.array_equal(obj.color, self.color)
+        return isinstance(obj, Board) and obj.key == self.key
 
     def __hash__(self):
-        return hash((self.color[0], self.color[1]))
+        return hash(self.key)
 
     def __str__(self):
         o_pieces, x_pieces = self.pieces
@@ -222,22 +417,436 @@ class Board():
             self.__str__())
 
 
+class BoardBatch():
+    """Many boards stored as uint64 arrays, moved in lockstep.
+
+    result holds the Result value of each board, or nan if it is ongoing"""
+    def __init__(self, n: int):
+        self.position = np.zeros((n,), dtype=np.uint64)
+        self.mask = np.zeros((n,), dtype=np.uint64)
+        self.age = np.zeros((n,), dtype=np.int64)
+        self.result = np.full((n,), np.nan)
+
+    @classmethod
+    def from_boards(cls, boards: Sequence[Board]):
+        batch = cls(len(boards))
+        batch.position[:] = [b.position for b in boards]
+        batch.mask[:] = [b.mask for b in boards]
+        batch.age[:] = [b.age for b in boards]
+        batch.result[:] = [np.nan if b.result is None else b.result.value
+                           for b in boards]
+        return batch
+
+    @classmethod
+    def from_bitboards(cls, position: np.ndarray, mask: np.ndarray):
+        batch = cls(len(mask))
+        batch.position[:] = position
+        batch.mask[:] = mask
+        batch.age[:] = popcounts(batch.mask)
+        mover = batch.position ^ batch.mask
+        win = check_terminal_positions(mover)
+        batch.result[win] = np.where(batch.age[win] % 2 == 1,
+                                     Result.o_win.value,
+                                     Result.x_win.value)
+        dead = ~(has_open_windows(batch.position) | has_open_windows(mover))
+        batch.result[~win & dead] = Result.draw.value
+        return batch
+
+    @classmethod
+    def from_moves(cls, move_strings: Sequence[str]):
+        """Vectorised Board.from_moves, playing ply by ply over the batch"""
+        lengths = np.array([len(m) for m in move_strings], dtype=np.int64)
+        n, plies = len(lengths), int(lengths.max(initial=0))
+        # pad with '0', which becomes -1, i.e. no move
+        moves = np.frombuffer(
+            ''.join(m.ljust(plies, '0') for m in move_strings).encode(),
+            dtype=np.uint8).reshape(n, plies).astype(np.int64) - ord('1')
+        if np.any(moves[np.arange(plies) < lengths[:, None]] < 0) \
+                or np.any(moves >= WIDTH):
+            raise ValueError('move strings must only contain digits 1-{}'
+                             .format(WIDTH))
+        batch = cls(n)
+        for ply in range(plies):
+            if np.any(batch.finished & (ply < lengths)):
+                raise ValueError('move played after the game finished')
+            batch.make_move(moves[:, ply])
+        return batch
+
+    @classmethod
+    def from_uci(cls, lines: Sequence[str]):
+        """Parse rows of the UCI connect-4.data set, returning the batch
+        and the value of each position for o"""
+        # a row is 'x,o,b,...,win': SIZE single character cells, column by
+        # column from the bottom, with x the first player
+        cells = np.frombuffer(
+            ''.join(line[:2 * SIZE - 1] for line in lines).encode(),
+            dtype=np.uint8).reshape(-1, 2 * SIZE - 1)[:, ::2]
+        o_color = ((cells == ord('x')).astype(np.uint64)
+                   << _UCI_BITS).sum(axis=1, dtype=np.uint64)
+        x_color = ((cells == ord('o')).astype(np.uint64)
+                   << _UCI_BITS).sum(axis=1, dtype=np.uint64)
+        mask = o_color | x_color
+        o_to_move = popcounts(mask) % 2 == 0
+        batch = cls.from_bitboards(np.where(o_to_move, o_color, x_color),
+                                   mask)
+        values = np.array([_UCI_VALUES[line[2 * SIZE]] for line in lines])
+        return batch, values
+
+    def create_fliplr(self):
+        """Batched Board.create_fliplr"""
+        flipped = copy(self)
+        flipped.position = mirror_bitboards(self.position)
+        flipped.mask = mirror_bitboards(self.mask)
+        flipped.age = self.age.copy()
+        flipped.result = self.result.copy()
+        return flipped
+
+    @property
+    def symmetrical(self):
+        return (mirror_bitboards(self.position) == self.position) & \
+            (mirror_bitboards(self.mask) == self.mask)
+
+    def to_boards(self) -> List[Board]:
+        return [Board.from_bitboards(position, mask)
+                for position, mask in zip(self.position.tolist(),
+                                          self.mask.tolist())]
+
+    def __len__(self):
+        return len(self.age)
+
+    @property
+    def key(self):
+        return self.position + self.mask
+
+    @property
+    def finished(self):
+        return ~np.isnan(self.result)
+
+    @property
+    def color(self):
+        o_to_move = self.age % 2 == 0
+        other = self.position ^ self.mask
+        return (np.where(o_to_move, self.position, other),
+                np.where(o_to_move, other, self.position))
+
+    @property
+    def valid_moves(self):
+        """(N, WIDTH) array of the playable columns of each board"""
+        valid = (self.mask[:, None] & _COLUMN_TOP) == 0
+        valid[self.finished] = False
+        return valid
+
+    def make_move(self, moves: Sequence[int]):
+        """Play moves[i] on board i. Finished boards, and boards given a
+        negative move, are left unchanged"""
+        moves = np.asarray(moves)
+        if kernels.HAVE_NUMBA:
+            full = kernels.play_array(
+                self.position.view(np.int64), self.mask.view(np.int64),
+                self.age, self.result, moves.astype(np.int64, copy=False),
+                Result.o_win.value, Result.x_win.value, Result.draw.value)
+            if full >= 0:
+                raise ValueError('make_move called with a full column')
+            return self.result
+        idx = np.flatnonzero(~self.finished & (moves >= 0))
+        cols = moves[idx]
+        mask = self.mask[idx]
+        if np.any(mask & _COLUMN_TOP[cols]):
+            raise ValueError('make_move called with a full column')
+
+        position = self.position[idx] ^ mask
+        mask = mask | (mask + _COLUMN_BOTTOM[cols])
+        age = self.age[idx] + 1
+        self.position[idx] = position
+        self.mask[idx] = mask
+        self.age[idx] = age
+
+        mover = position ^ mask
+        win = check_terminal_positions(mover)
+        self.result[idx[win]] = np.where(age[win] % 2 == 1,
+                                         Result.o_win.value,
+                                         Result.x_win.value)
+        dead = ~(has_open_windows(position) | has_open_windows(mover))
+        self.result[idx[~win & dead]] = Result.draw.value
+        return self.result
+
+    def to_array(self, out: Optional[np.ndarray] = None):
+        """(N, 3, HEIGHT, WIDTH) array matching Board.to_array"""
+        if out is None:
+            out = np.empty((len(self), 3, HEIGHT, WIDTH), dtype=np.uint8)
+        o_color, x_color = self.color
+        return encode_planes(o_color, x_color, self.age, out=out)
+
+
+def encode_planes(o_colors: Sequence[int],
+                  x_colors: Sequence[int],
+                  ages: Sequence[int],
+                  out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Encode bitboards into the (N, 3, HEIGHT, WIDTH) network input of
+    to_move, o_pieces and x_pieces planes. Writes into out if given,
+    otherwise into a new float32 array"""
+    ages = np.asarray(ages)
+    if out is None:
+        out = np.empty((len(ages), 3, HEIGHT, WIDTH), dtype=np.float32)
+    colors = np.stack([np.asarray(o_colors, dtype='<u8'),
+                       np.asarray(x_colors, dtype='<u8')], axis=1)
+    bits = np.unpackbits(colors.view(np.uint8), axis=1, bitorder='little')
+    out[:, 1:] = bits.reshape(-1, 2, 64)[:, :, BIT_INDEX]
+    out[:, 0] = (ages % 2 == 0)[:, None, None]
+    return out
+
+
+def encode_boards(boards: Sequence[Board],
+                  out: Optional[np.ndarray] = None) -> np.ndarray:
+    colors = [b.color for b in boards]
+    return encode_planes([c[0] for c in colors],
+                         [c[1] for c in colors],
+                         [b.age for b in boards],
+                         out=out)
+
+
+def unpack_pieces(pieces: int) -> np.ndarray:
+    """(HEIGHT, WIDTH) bool array of the pieces in a bitboard"""
+    bits = np.unpackbits(np.array([pieces], dtype='<u8').view(np.uint8),
+                         bitorder='little')
+    return bits[BIT_INDEX].astype(np.bool_)
+
+
+def popcounts(pieces: np.ndarray) -> np.ndarray:
+    """Vectorised popcount over a uint64 array"""
+    pieces = np.asarray(pieces, dtype='<u8')
+    if kernels.HAVE_NUMBA:
+        return kernels.popcount_array(_as_int64(pieces))
+    bits = np.unpackbits(pieces.view(np.uint8).reshape(-1, 8), axis=1)
+    return bits.sum(axis=1, dtype=np.int64)
+
+
+def check_terminal_positions(pieces: np.ndarray) -> np.ndarray:
+    """Vectorised Board._check_terminal_position over a uint64 array"""
+    if kernels.HAVE_NUMBA:
+        return kernels.terminal_array(_as_int64(pieces))
+    found = np.zeros(pieces.shape, dtype=np.bool_)
+    for shift in _DIRECTIONS:
+        y = pieces & (pieces >> shift)
+        found |= (y & (y >> (shift + shift))) != 0
+    return found
+
+
+def mirror_bitboards(pieces: np.ndarray) -> np.ndarray:
+    """Vectorised Board.flip_color over a uint64 array"""
+    if kernels.HAVE_NUMBA:
+        return kernels.mirror_array(_as_int64(pieces)).view(np.uint64)
+    flipped = np.zeros_like(pieces)
+    for i in range(WIDTH):
+        flipped |= ((pieces >> _COLUMN_SHIFT[i]) & _COL1) \
+            << _COLUMN_SHIFT[WIDTH - 1 - i]
+    return flipped
+
+
+def has_open_windows(opponent: np.ndarray) -> np.ndarray:
+    """Vectorised open_windows(opponent) != 0 over a uint64 array"""
+    if kernels.HAVE_NUMBA:
+        return kernels.open_windows_array(_as_int64(opponent))
+    free = _BOARD_MASK & ~opponent
+    found = np.zeros(opponent.shape, dtype=np.bool_)
+    for shift in _DIRECTIONS:
+        y = free & (free >> shift)
+        found |= (y & (y >> (shift + shift))) != 0
+    return found
+
+
+def _as_int64(pieces: np.ndarray) -> np.ndarray:
+    # the kernels take int64, see oinkoink.kernels
+    return np.ascontiguousarray(pieces, dtype=np.uint64).view(np.int64)
+
+
+# uint64 versions of the constants, so numpy never casts to float
+_BOARD_MASK = np.uint64(BOARD_MASK)
+_COL1 = np.uint64(COL1)
+_COLUMN_SHIFT = [np.uint64(H1 * i) for i in range(WIDTH)]
+_COLUMN_BOTTOM = np.array(COLUMN_BOTTOM, dtype=np.uint64)
+_COLUMN_TOP = np.array(COLUMN_TOP, dtype=np.uint64)
+_DIRECTIONS = [np.uint64(d) for d in DIRECTIONS]
+# bit of each UCI cell, which run up each column in turn
+_UCI_BITS = np.array([H1 * (i // HEIGHT) + i % HEIGHT for i in range(SIZE)],
+                     dtype=np.uint64)
+_UCI_VALUES = {'w': 1.0, 'd': 0.5, 'l': 0.0}
+
+
+def open_windows(opponent: int) -> int:
+    """The 4 cell windows without a piece of opponent in them. Window bits
+    are n * SIZE1 + its first cell, for the nth of the DIRECTIONS"""
+    free = BOARD_MASK & ~opponent
+    windows = 0
+    for n, shift in enumerate(DIRECTIONS):
+        y = free & (free >> shift)
+        windows |= (y & (y >> 2 * shift)) << (n * SIZE1)
+    return windows
+
+
+def _windows_through(cell: int) -> int:
+    windows = 0
+    for n, shift in enumerate(DIRECTIONS):
+        for i in range(4):
+            start = cell - i * shift
+            if start >= 0:
+                windows |= ALL_WINDOWS & (1 << (n * SIZE1 + start))
+    return windows
+
+
+# o's windows are held in the lowest WINDOW_BITS bits of Board.windows, x's
+# above them. 69 of the bits are windows on a 7x6 board
+WINDOW_BITS = len(DIRECTIONS) * SIZE1
+ALL_WINDOWS = open_windows(0)
+EMPTY_WINDOWS = ALL_WINDOWS | (ALL_WINDOWS << WINDOW_BITS)
+# CLOSE_WINDOWS[side][piece] removes the other side's windows through piece
+CLOSE_WINDOWS = [{1 << cell: ~(_windows_through(cell)
+                               << (WINDOW_BITS * (1 - side)))
+                  for cell in range(SIZE1) if BOARD_MASK & (1 << cell)}
+                 for side in Side]
+
+
+def winning_cells(pieces: int, mask: int) -> int:
+    """Empty cells that would complete 4 in a row for pieces"""
+    # vertical
+    cells = (pieces << 1) & (pieces << 2) & (pieces << 3)
+    for shift in (H1, HEIGHT, H2):
+        # 3 in a row either side of the cell, then 2 + 1 split either way
+        pair = (pieces << shift) & (pieces << 2 * shift)
+        cells |= pair & (pieces << 3 * shift)
+        cells |= pair & (pieces >> shift)
+        pair = (pieces >> shift) & (pieces >> 2 * shift)
+        cells |= pair & (pieces << shift)
+        cells |= pair & (pieces >> 3 * shift)
+    return cells & (BOARD_MASK ^ mask)
+
+
+def possible_cells(mask: int) -> int:
+    """The cell each column would be played into next"""
+    return (mask + BOTTOM) & BOARD_MASK
+
+
+def non_losing_cells(position: int, mask: int) -> int:
+    """Playable cells that neither leave an opponent's winning cell open nor
+    give them one directly above"""
+    possible = possible_cells(mask)
+    opponent_win = winning_cells(position ^ mask, mask)
+    forced = possible & opponent_win
+    if forced:
+        if forced & (forced - 1):
+            # more than one threat to block
+            return 0
+        possible = forced
+    return possible & ~(opponent_win >> 1)
+
+
+def cell_columns(cells: int) -> Set[int]:
+    return set([i for i in range(WIDTH) if cells & COLUMN[i]])
+
+
+def lowest_column(cells: int) -> int:
+    return ((cells & -cells).bit_length() - 1) // H1
+
+
+def popcount(pieces: int) -> int:
+    return bin(pieces).count('1')
+
+
+def _board_from_record(record: bytes) -> Board:
+    return Board.from_record(record)
+
+
+def encode_records(boards: Sequence[Board]) -> bytes:
+    return b''.join([b.to_record() for b in boards])
+
+
+def decode_records(records: bytes) -> List[Board]:
+    return [Board.from_bitboards(position, mask)
+            for position, mask in RECORD.iter_unpack(records)]
+
+
+# frontiers smaller than this aren't worth sending to worker processes
+PARALLEL_FRONTIER = 100000
+
+
 def make_random_ips(plies):
-    ips = set()
-    board = Board()
-    expand(ips, board, plies)
-    return ips
-
-
-def expand(ips: Set,
-           board: Board,
-           plies: int) -> None:
-    if plies == 0:
-        if board.result is None:
-            ips.add(board)
-        return
-    valid_moves = board.valid_moves
-    for move in valid_moves:
-        new_board = copy(board)
-        new_board.make_move(move)
-        expand(ips, new_board, plies - 1)
+    return set(iterate_positions(plies))
+
+
+def iterate_positions(plies: int,
+                      mirror: bool = False,
+                      processes: int = 1) -> Iterator[Board]:
+    """Yield each ongoing position after plies moves once, in key order.
+    With mirror only one of a position and its mirror image is yielded"""
+    for key in generate_positions(plies, mirror, processes):
+        yield Board.from_key(int(key))
+
+
+def generate_positions(plies: int,
+                       mirror: bool = False,
+                       processes: int = 1) -> np.ndarray:
+    """Sorted uint64 keys of the ongoing positions after plies moves.
+
+    The tree is expanded a ply at a time over arrays of bitboards, dropping
+    duplicate positions at every ply. With processes > 1 each large ply is
+    split between a pool of workers and merged before the next one"""
+    position = np.zeros((1,), dtype=np.uint64)
+    mask = np.zeros((1,), dtype=np.uint64)
+    pool = Pool(processes=processes) if processes > 1 else None
+    try:
+        for _ in range(plies):
+            if pool is None or len(position) < PARALLEL_FRONTIER:
+                position, mask = _expand_frontier(position, mask, mirror)
+                continue
+            chunks = np.array_split(np.arange(len(position)), processes)
+            frontiers = pool.starmap(_expand_frontier,
+                                     [(position[c], mask[c], mirror)
+                                      for c in chunks])
+            position, mask = _unique_positions(
+                np.concatenate([f[0] for f in frontiers]),
+                np.concatenate([f[1] for f in frontiers]),
+                mirror)
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return position + mask
+
+
+def save_positions(file_name: str, keys: np.ndarray) -> None:
+    np.save(file_name, np.asarray(keys, dtype=np.uint64))
+
+
+def load_positions(file_name: str) -> np.ndarray:
+    """Memory map keys written by save_positions"""
+    return np.load(file_name, mmap_mode='r')
+
+
+def _expand_frontier(position: np.ndarray,
+                     mask: np.ndarray,
+                     mirror: bool) -> Tuple[np.ndarray, np.ndarray]:
+    positions, masks = [], []
+    for col in range(WIDTH):
+        playable = (mask & _COLUMN_TOP[col]) == 0
+        child_mask = mask[playable]
+        child_position = position[playable] ^ child_mask
+        child_mask = child_mask | (child_mask + _COLUMN_BOTTOM[col])
+        mover = child_position ^ child_mask
+        ongoing = ~check_terminal_positions(mover) & \
+            (has_open_windows(child_position) | has_open_windows(mover))
+        positions.append(child_position[ongoing])
+        masks.append(child_mask[ongoing])
+    return _unique_positions(np.concatenate(positions),
+                             np.concatenate(masks),
+                             mirror)
+
+
+def _unique_positions(position: np.ndarray,
+                      mask: np.ndarray,
+                      mirror: bool) -> Tuple[np.ndarray, np.ndarray]:
+    if mirror:
+        # keep whichever of the position and its mirror has the lower key
+        flip = mirror_bitboards(position + mask) < position + mask
+        position = np.where(flip, mirror_bitboards(position), position)
+        mask = np.where(flip, mirror_bitboards(mask), mask)
+    _, idx = np.unique(position + mask, return_index=True)
+    return position[idx], mask[idx]
@@ -0,0 +1,131 @@
+from oinkoink.board import Board, SIZE, WIDTH, generate_positions
+from oinkoink.solver import (MappedTranspositionTable, Solver, best_move,
+                             score_to_value, scored_tree)
+from oinkoink.utils import value_to_side
+
+from multiprocessing import Pool
+import numpy as np
+import os
+from typing import List, Optional
+
+
+class OpeningBook():
+    """Solver scores of every ongoing position up to some plies, stored
+    once per mirror pair under its canonical_key. keys are sorted, so a
+    lookup is a binary search, even when both arrays are memory maps"""
+    def __init__(self, keys: np.ndarray, scores: np.ndarray):
+        self.keys = keys
+        self.scores = scores
+
+    @classmethod
+    def load(cls, path: str):
+        return cls(np.load(os.path.join(path, 'keys.npy'), mmap_mode='r'),
+                   np.load(os.path.join(path, 'scores.npy'), mmap_mode='r'))
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'keys.npy'), self.keys)
+        np.save(os.path.join(path, 'scores.npy'), self.scores)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get(self, board: Board) -> Optional[int]:
+        """Score of board for the player to move, None if not in the book"""
+        key = np.uint64(board.canonical_key)
+        i = np.searchsorted(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return int(self.scores[i])
+        return None
+
+    def __contains__(self, board: Board):
+        return self.get(board) is not None
+
+    def analyze(self, board: Board) -> Optional[List[Optional[int]]]:
+        """Solver.analyze from the book, None unless every child is known"""
+        if board.result is not None:
+            return None
+        scores = [None] * WIDTH
+        for move, _, win, draw in board.children():
+            if win:
+                scores[move] = (SIZE + 1 - board.age) // 2
+            elif draw:
+                scores[move] = 0
+            else:
+                score = self.get(board.child(move, win, draw))
+                if score is None:
+                    return None
+                scores[move] = -score
+        return scores
+
+    def make_move(self, board: Board):
+        """Play the book move as a player would, returning None and leaving
+        board alone when the position isn't covered"""
+        scores = self.analyze(board)
+        if scores is None:
+            return None
+        move = best_move(scores)
+        tree = scored_tree(board, scores)
+        value = value_to_side(score_to_value(scores[move]),
+                              board.player_to_move)
+        board.make_move(move)
+        return move, value, tree
+
+
+def build_book(plies: int,
+               weak: bool = False,
+               processes: int = 1,
+               solver: Optional[Solver] = None,
+               table_path: Optional[str] = None) -> OpeningBook:
+    """Solve every position after plies moves, then score each shallower
+    ply from its children. With weak only the sign of the scores is
+    kept. With table_path the solvers share a MappedTranspositionTable
+    kept there between builds. With processes each worker makes its own
+    Solver, so solver can only be given for a build in this process"""
+    if processes > 1 and solver is not None:
+        raise ValueError("solver can't be sent to worker processes, "
+                         "use processes=1")
+    keys = generate_positions(plies, mirror=True)
+    if processes > 1:
+        if table_path is not None:
+            # create or upgrade the file once, before the workers map it
+            MappedTranspositionTable(table_path).close()
+        with Pool(processes=processes) as pool:
+            chunks = np.array_split(keys, processes * 4)
+            scores = np.concatenate(pool.starmap(
+                _solve_keys, [(c, weak, None, table_path) for c in chunks]))
+    else:
+        scores = _solve_keys(keys, weak, solver, table_path)
+    levels = [OpeningBook(keys, scores)]
+
+    for ply in range(plies - 1, -1, -1):
+        keys = generate_positions(ply, mirror=True)
+        # every ongoing child is in the next ply's level
+        scores = [max(s for s in levels[-1].analyze(Board.from_key(int(k)))
+                      if s is not None)
+                  for k in keys]
+        if weak:
+            scores = np.sign(scores)
+        levels.append(OpeningBook(keys, np.array(scores, dtype=np.int8)))
+
+    keys = np.concatenate([level.keys for level in levels])
+    scores = np.concatenate([level.scores for level in levels])
+    order = np.argsort(keys)
+    return OpeningBook(keys[order], scores[order])
+
+
+def _solve_keys(keys: np.ndarray,
+                weak: bool,
+                solver: Optional[Solver] = None,
+                table_path: Optional[str] = None) -> np.ndarray:
+    table = None
+    if solver is None:
+        table = None if table_path is None else \
+            MappedTranspositionTable(table_path)
+        solver = Solver(table=table)
+    scores = [solver.solve(Board.from_key(int(k)), weak) for k in keys]
+    if table is not None:
+        table.close()
+    if weak:
+        scores = np.sign(scores)
+    return np.array(scores, dtype=np.int8)
@@ -1,29 +1,105 @@
-from oinkoink.board import Board
+from oinkoink.board import Board, SIZE
 from oinkoink.utils import Connect4Stats as info
 
 from copy import deepcopy
 import numpy as np
-from typing import Callable, Dict, Optional, Tuple
+from typing import Callable, Dict, List, Optional
+
+
+class PositionTable():
+    """Evaluations by key, in a dict per board.age. Pieces are never
+    taken off, so once every search using the table has its root at age n
+    nothing younger can be reached again, and release_below(n) drops those
+    buckets whole rather than entry by entry. Games sharing the table each
+    release as their own user, and only below the youngest user's root"""
+    def __init__(self):
+        self.buckets: List[Dict] = [{} for _ in range(SIZE + 1)]
+        # the last root each user released below
+        self.roots: Dict[str, int] = {}
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.buckets)
+
+    def release_below(self, age: int, user: Optional[str] = None):
+        if user is not None:
+            self.roots[user] = age
+            # list() copies the values at once, other threads add users
+            age = min(list(self.roots.values()))
+        for i in range(age):
+            if self.buckets[i]:
+                self.buckets[i] = {}
 
 
 class Evaluator():
+    """Caches evaluate_fn by board.key. With mirror=True a position and its
+    mirror image share an entry, stored for the canonical_key orientation.
+    evaluate_batch_fn, if given, evaluates a list of boards at once for
+    prefetch"""
     def __init__(self,
                  evaluate_fn: Callable,
-                 position_table: Optional[Dict[Tuple, Tuple]] = None,
-                 store_position: Optional[bool] = True):
+                 position_table: Optional[PositionTable] = None,
+                 store_position: Optional[bool] = True,
+                 mirror: Optional[bool] = False,
+                 evaluate_batch_fn: Optional[Callable] = None):
         self.evaluate_fn = evaluate_fn
-        self.position_table = {} if position_table is None else position_table
+        self.position_table = PositionTable() if position_table is None \
+            else position_table
         self.store_position = store_position
+        self.mirror = mirror
+        self.evaluate_batch_fn = evaluate_batch_fn
 
     def __call__(self, board: Board):
-        b_value = board.to_int_tuple()
-        position_eval = self.position_table.get(b_value)
+        if self.mirror:
+            b_value = board.canonical_key
+            flipped = b_value != board.key
+        else:
+            b_value = board.key
+            flipped = False
+        # index the list directly, a __getitem__ call costs as much as the
+        # dict lookup
+        bucket = self.position_table.buckets[board.age]
+        position_eval = bucket.get(b_value)
         if position_eval is None:
             position_eval = self.evaluate_fn(board)
             if self.store_position:
-                self.position_table[b_value] = position_eval
+                bucket[b_value] = \
+                    mirror_evaluation(position_eval) if flipped \
+                    else position_eval
+        elif flipped:
+            position_eval = mirror_evaluation(position_eval)
         return deepcopy(position_eval)
 
+    def prefetch(self, boards: List[Board], batch_size: int = 4096):
+        """Evaluate the boards not in the table with evaluate_batch_fn,
+        batch_size at a time, so later calls find them there"""
+        if self.evaluate_batch_fn is None or not self.store_position:
+            return
+        missing = {}
+        for board in boards:
+            key = board.canonical_key if self.mirror else board.key
+            if key not in missing and \
+                    key not in self.position_table.buckets[board.age]:
+                missing[key] = board
+        missing = list(missing.items())
+        for i in range(0, len(missing), batch_size):
+            chunk = missing[i:i + batch_size]
+            evaluations = self.evaluate_batch_fn([b for _, b in chunk])
+            for (key, board), position_eval in zip(chunk, evaluations):
+                self.position_table.buckets[board.age][key] = \
+                    mirror_evaluation(position_eval) if key != board.key \
+                    else position_eval
+
+    def release_below(self, age: int, user: Optional[str] = None):
+        self.position_table.release_below(age, user)
+
+
+def mirror_evaluation(position_eval):
+    """Values are unchanged by mirroring the board, priors are reversed"""
+    if isinstance(position_eval, tuple):
+        value, prior = position_eval
+        return value, np.flip(prior).copy()
+    return position_eval
+
 
 def evaluate_centre(board: Board):
     value = 0.5 + \
@@ -41,7 +117,15 @@ def evaluate_centre_with_prior(board: Board):
 def evaluate_nn(board: Board,
                 model):
     value, prior = model(board)
-    return float(value), prior
+    # numpy 2 won't convert a 1 element array to a float
+    return float(np.squeeze(value)), prior
+
+
+def evaluate_nn_batch(boards: List[Board],
+                      model):
+    """evaluate_nn of each board, from one call of the model"""
+    values, priors = model(boards)
+    return [(float(value), prior) for value, prior in zip(values, priors)]
 
 
 # Helper functions
@@ -1,71 +1,314 @@
-from oinkoink.board import Board
+from oinkoink.board import Board, SIZE
+from oinkoink.book import OpeningBook
 from oinkoink.evaluators import Evaluator
 from oinkoink.player import BasePlayer
+from oinkoink.solver import CENTRE_ORDER
 from oinkoink.tree import Tree
 from oinkoink.utils import same_side, Side
 
-from anytree import Node
+from multiprocessing import current_process, Pool
+import time
+from typing import Callable, Dict, List, Optional, Tuple
 
-from typing import Callable, Dict, Tuple
+
+CENTRE_RANK = {c: i for i, c in enumerate(CENTRE_ORDER)}
+
+
+class OutOfBudget(Exception):
+    pass
+
+
+class SearchBudget():
+    """Counts alpha_beta nodes, raising OutOfBudget once there have been
+    more than max_nodes or max_seconds have passed"""
+    def __init__(self,
+                 max_seconds: Optional[float] = None,
+                 max_nodes: Optional[int] = None):
+        self.deadline = None if max_seconds is None else \
+            time.perf_counter() + max_seconds
+        self.max_nodes = max_nodes
+        self.nodes = 0
+
+    def spend(self):
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise OutOfBudget()
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise OutOfBudget()
 
 
 class GridSearch(BasePlayer):
+    """Searches plies deep. Given max_seconds or max_nodes per move it
+    deepens one ply at a time up to plies instead, playing the best move
+    of the deepest search it finished. With prefetch_plies each node that
+    many plies above the leaves first has the evaluator prefetch every
+    leaf below it, so a batched evaluator sees few large batches. With
+    processes the root's children, or with split_plies=2 its
+    grandchildren, are searched by a pool of that many processes, each
+    with its own copy of the evaluator. The pool lasts one move. A
+    daemonic process, such as a Match worker, can't start one and
+    searches alone"""
     def __init__(self,
                  name: str,
                  plies: int,
-                 evaluator: Evaluator):
+                 evaluator: Evaluator,
+                 book: Optional[OpeningBook] = None,
+                 max_seconds: Optional[float] = None,
+                 max_nodes: Optional[int] = None,
+                 prefetch_plies: int = 0,
+                 processes: int = 1,
+                 split_plies: int = 1):
         super().__init__(name)
+        if processes > 1 and max_nodes is not None:
+            raise ValueError("max_nodes can't be shared between processes, "
+                             "use max_seconds")
+        if split_plies not in (1, 2):
+            raise ValueError("split_plies must be 1 or 2, not {}".format(
+                split_plies))
         self.plies = plies
         self.evaluator = evaluator
+        self.book = book
+        self.max_seconds = max_seconds
+        self.max_nodes = max_nodes
+        self.prefetch_plies = prefetch_plies
+        self.processes = processes
+        self.split_plies = split_plies
+        # plies searched for the last move
+        self.depth = None
 
     def make_move(self, board):
-        tree = Tree(board)
+        if self.book is not None:
+            played = self.book.make_move(board)
+            if played is not None:
+                return played
 
-        tree.expand_node(tree.root,
-                         self.plies)
-        nega_max(tree.root,
-                 self.plies,
-                 self.evaluator)
+        if self.processes > 1 and not current_process().daemon:
+            with Pool(self.processes, initializer=_init_worker,
+                      initargs=(self.evaluator,)) as pool:
+                tree = self._deepen(board, pool)
+        else:
+            tree = self._deepen(board)
 
         child = tree.best_move()
+        tree.root.data.search_value = child.data.absolute_value
         board.make_move(child.name)
         return child.name, child.data.absolute_value, tree
 
+    def _deepen(self, board: Board, pool: Optional[Pool] = None) -> Tree:
+        if self.max_seconds is None and self.max_nodes is None:
+            self.depth = self.plies
+            return self._search(board, self.plies, pool)
+
+        budget = SearchBudget(self.max_seconds, self.max_nodes)
+        # the best reply found for each key, tried first next time
+        moves: Dict[int, int] = {}
+        # one ply is at most WIDTH evaluations, so always finishes
+        tree = search(board, 1, self.evaluator, moves,
+                      prefetch_plies=self.prefetch_plies)
+        self.depth = 1
+        # past the end of the game deeper searches change nothing
+        for plies in range(2, min(self.plies, SIZE - board.age) + 1):
+            try:
+                tree = self._search(board, plies, pool, moves, budget)
+            except OutOfBudget:
+                break
+            self.depth = plies
+        return tree
+
+    def _search(self,
+                board: Board,
+                plies: int,
+                pool: Optional[Pool] = None,
+                moves: Optional[Dict[int, int]] = None,
+                budget: Optional[SearchBudget] = None) -> Tree:
+        if pool is None:
+            return search(board, plies, self.evaluator, moves, budget,
+                          self.prefetch_plies)
+        # the workers keep to the deadline, but don't share moves
+        max_seconds = None if budget is None else \
+            budget.deadline - time.perf_counter()
+        return parallel_search(pool, board, plies, self.split_plies,
+                               max_seconds, self.prefetch_plies)
+
     def __str__(self):
         return super().__str__() + ", type: Computer"
 
 
-def nega_max(node: Node,
-             plies: int,
-             evaluator: Callable[[Board],
-                                 Tuple[float, Dict[int, float]]]):
-    # https://en.wikipedia.org/wiki/Negamax
-    if node.data.board.result is not None:
-        board = node.data.board
-        # Prefer faster wins and slower losses
-        if same_side(board.result, Side.o):
-            value = board.result.value - board.age / 10000.0
+def search(board: Board,
+           plies: int,
+           evaluator: Callable[[Board], float],
+           moves: Optional[Dict[int, int]] = None,
+           budget: Optional[SearchBudget] = None,
+           prefetch_plies: int = 0) -> Tree:
+    """A 1 ply tree of board's children with their values plies deep. Each
+    is searched with a full window so their values are exact, for
+    best_move's tie break and the policy"""
+    if prefetch_plies >= plies:
+        evaluator.prefetch(frontier(board, plies))
+    tree = Tree(board)
+    tree.expand_node(tree.root, 1)
+    table: Dict[int, Tuple[float, float]] = {}
+    for child in tree.root.children:
+        if child.data.board.result is None:
+            child.data.search_value = alpha_beta(
+                child.data.board, plies - 1, -2, 2, evaluator, table,
+                moves, budget, prefetch_plies)
+    return tree
+
+
+def frontier(board: Board, plies: int) -> List[Board]:
+    """The distinct unfinished positions plies moves on from board, the
+    leaves a search of board may evaluate"""
+    boards = {board.key: board}
+    for _ in range(plies):
+        children = {}
+        for parent in boards.values():
+            for move, key, win, draw in parent.children():
+                if not win and not draw and key not in children:
+                    children[key] = parent.child(move, win, draw)
+        boards = children
+    return list(boards.values())
+
+
+def parallel_search(pool: Pool,
+                    board: Board,
+                    plies: int,
+                    split_plies: int = 1,
+                    max_seconds: Optional[float] = None,
+                    prefetch_plies: int = 0) -> Tree:
+    """search, with the root's children searched by pool. The workers'
+    full window values are exact, so the merged tree is the same. With
+    split_plies=2 the pool searches the grandchildren instead, taking the
+    best of them for each child here. That is up to WIDTH times the tasks
+    to spread over the pool, but without the pruning between them"""
+    tree = Tree(board)
+    tree.expand_node(tree.root, 1)
+    children = [c for c in tree.root.children
+                if c.data.board.result is None]
+    split = split_plies == 2 and plies > 1
+    task_plies = plies - 2 if split else plies - 1
+    tasks = []
+    for child in children:
+        child_board = child.data.board
+        if split:
+            tasks.extend((child, child_board.child(move, win, draw))
+                         for move, _, win, draw in child_board.children())
         else:
-            value = board.result.value + board.age / 10000.0
-        node.data.position_value = value
-        return value
+            tasks.append((child, child_board))
+    values = pool.starmap(
+        _search_worker,
+        [(b, task_plies, max_seconds, prefetch_plies)
+         for _, b in tasks],
+        chunksize=1)
+    if None in values:
+        raise OutOfBudget()
+
+    for child in children:
+        child_values = [v for (c, _), v in zip(tasks, values) if c is child]
+        if not split:
+            child.data.search_value = child_values[0]
+        elif child.data.board.player_to_move == Side.o:
+            child.data.search_value = max(child_values)
+        else:
+            child.data.search_value = min(child_values)
+    return tree
+
+
+_worker_evaluator = None
+
+
+def _init_worker(evaluator: Evaluator):
+    global _worker_evaluator
+    _worker_evaluator = evaluator
+
+
+def _search_worker(board: Board,
+                   plies: int,
+                   max_seconds: Optional[float],
+                   prefetch_plies: int) -> Optional[float]:
+    """alpha_beta with a full window, None if max_seconds ran out"""
+    budget = None if max_seconds is None else SearchBudget(max_seconds)
+    if 0 < prefetch_plies and plies <= prefetch_plies:
+        _worker_evaluator.prefetch(frontier(board, plies))
+    try:
+        return alpha_beta(board, plies, -2, 2, _worker_evaluator, {},
+                          budget=budget, prefetch_plies=prefetch_plies)
+    except OutOfBudget:
+        return None
+
+
+def terminal_value(board: Board) -> float:
+    # Prefer faster wins and slower losses
+    if same_side(board.result, Side.o):
+        return board.result.value - board.age / 10000.0
+    return board.result.value + board.age / 10000.0
+
+
+def alpha_beta(board: Board,
+               plies: int,
+               alpha: float,
+               beta: float,
+               evaluator: Callable[[Board], float],
+               table: Dict[int, Tuple[float, float]],
+               moves: Optional[Dict[int, int]] = None,
+               budget: Optional[SearchBudget] = None,
+               prefetch_plies: int = 0) -> float:
+    """Value of board searched plies deep, o maximising and x minimising.
+    Exact if it lies between alpha and beta, else a bound beyond them.
+    table holds the (lower, upper) bounds found for each key, and as the
+    age fixes the plies left a key needs nothing else. moves, if given,
+    holds the best move found for each key, tried first and updated"""
+    # https://en.wikipedia.org/wiki/Alpha%E2%80%93beta_pruning
+    if budget is not None:
+        budget.spend()
+    if board.result is not None:
+        return terminal_value(board)
     if plies == 0:
-        value = evaluator(node.data.board)
-        node.data.position_value = value
-        return value
+        value = evaluator(board)
+        # evaluators with a prior return (value, prior)
+        return value[0] if isinstance(value, tuple) else value
 
-    side = node.data.board.player_to_move
+    lower, upper = table.get(board.key, (-2, 2))
+    if lower == upper or lower >= beta:
+        return lower
+    if upper <= alpha:
+        return upper
+    alpha, beta = max(alpha, lower), min(beta, upper)
+    if plies == prefetch_plies:
+        evaluator.prefetch(frontier(board, plies))
 
-    if side == Side.o:
-        value = -2
-        for child in node.children:
-            value = max(value,
-                        nega_max(child, plies - 1, evaluator))
-    else:
-        value = 2
-        for child in node.children:
-            value = min(value,
-                        nega_max(child, plies - 1, evaluator))
+    # winning moves first, then the best move found before, then from the
+    # centre out
+    first = None if moves is None else moves.get(board.key)
+    children = sorted(board.children(),
+                      key=lambda c: (not c[2], c[0] != first,
+                                     CENTRE_RANK[c[0]]))
+    maximise = board.player_to_move == Side.o
+    value = -2 if maximise else 2
+    best = None
+    low, high = alpha, beta
+    for move, _, win, draw in children:
+        child_value = alpha_beta(board.child(move, win, draw), plies - 1,
+                                 low, high, evaluator, table, moves, budget,
+                                 prefetch_plies)
+        if (child_value > value) if maximise else (child_value < value):
+            value = child_value
+            best = move
+        if maximise:
+            low = max(low, value)
+        else:
+            high = min(high, value)
+        if low >= high:
+            break
+    if moves is not None:
+        moves[board.key] = best
 
-    node.data.search_value = value
+    if value <= alpha:
+        upper = value
+    elif value >= beta:
+        lower = value
+    else:
+        lower = upper = value
+    table[board.key] = (lower, upper)
     return value
+
@@ -0,0 +1,217 @@
+"""Bitboard kernels, compiled with numba when it is installed.
+
+Without numba they run as plain python. board.py only calls the array
+kernels when HAVE_NUMBA, otherwise it keeps to its numpy versions.
+Arrays are passed as int64, as numba casts mixed uint64/int64 arithmetic
+to float; every bitboard fits in SIZE1 < 63 bits so the view is safe"""
+from oinkoink.utils import Connect4Stats as info
+
+import numpy as np
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda fn: fn
+
+
+WIDTH = info.width
+HEIGHT = info.height
+H1 = HEIGHT + 1
+H2 = HEIGHT + 2
+SIZE1 = H1 * WIDTH
+COL1 = (1 << H1) - 1
+BOTTOM = ((1 << SIZE1) - 1) // COL1
+BOARD_MASK = ((1 << SIZE1) - 1) ^ (BOTTOM << HEIGHT)
+COLUMN = tuple(((1 << HEIGHT) - 1) << (H1 * i) for i in range(WIDTH))
+SIZE = WIDTH * HEIGHT
+
+
+@njit(cache=True)
+def is_win(pieces):
+    for shift in (1, H1, HEIGHT, H2):
+        y = pieces & (pieces >> shift)
+        if y & (y >> (2 * shift)):
+            return True
+    return False
+
+
+@njit(cache=True)
+def has_open_window(opponent):
+    return is_win(BOARD_MASK & ~opponent)
+
+
+@njit(cache=True)
+def popcount(pieces):
+    n = 0
+    while pieces:
+        pieces &= pieces - 1
+        n += 1
+    return n
+
+
+@njit(cache=True)
+def mirror(pieces):
+    flipped = 0
+    for i in range(WIDTH):
+        flipped |= ((pieces >> (H1 * i)) & COL1) << (H1 * (WIDTH - 1 - i))
+    return flipped
+
+
+@njit(cache=True)
+def is_playable(mask, col):
+    return (mask & (1 << (H1 * col + HEIGHT - 1))) == 0
+
+
+@njit(cache=True)
+def play(position, mask, col):
+    """position and mask after the player to move plays col"""
+    return position ^ mask, mask | (mask + (1 << (H1 * col)))
+
+
+@njit(cache=True)
+def terminal_array(pieces):
+    found = np.zeros(pieces.shape, dtype=np.bool_)
+    for i in range(pieces.shape[0]):
+        found[i] = is_win(pieces[i])
+    return found
+
+
+@njit(cache=True)
+def open_windows_array(opponent):
+    found = np.zeros(opponent.shape, dtype=np.bool_)
+    for i in range(opponent.shape[0]):
+        found[i] = has_open_window(opponent[i])
+    return found
+
+
+@njit(cache=True)
+def mirror_array(pieces):
+    flipped = np.zeros_like(pieces)
+    for i in range(pieces.shape[0]):
+        flipped[i] = mirror(pieces[i])
+    return flipped
+
+
+@njit(cache=True)
+def popcount_array(pieces):
+    counts = np.zeros(pieces.shape, dtype=np.int64)
+    for i in range(pieces.shape[0]):
+        counts[i] = popcount(pieces[i])
+    return counts
+
+
+@njit(cache=True)
+def play_array(position, mask, age, result, moves,
+               o_win, x_win, draw):
+    """BoardBatch.make_move in one pass, updating the arrays in place.
+    Returns the index of the first board given a full column, else -1"""
+    for i in range(moves.shape[0]):
+        if moves[i] < 0 or not np.isnan(result[i]):
+            continue
+        if not is_playable(mask[i], moves[i]):
+            return i
+    for i in range(moves.shape[0]):
+        if moves[i] < 0 or not np.isnan(result[i]):
+            continue
+        p, m = play(position[i], mask[i], moves[i])
+        position[i] = p
+        mask[i] = m
+        age[i] += 1
+        mover = p ^ m
+        if is_win(mover):
+            result[i] = o_win if age[i] % 2 == 1 else x_win
+        elif not (has_open_window(p) or has_open_window(mover)):
+            result[i] = draw
+    return -1
+
+
+@njit(cache=True)
+def winning_cells(pieces, mask):
+    cells = (pieces << 1) & (pieces << 2) & (pieces << 3)
+    for shift in (H1, HEIGHT, H2):
+        pair = (pieces << shift) & (pieces << 2 * shift)
+        cells |= pair & (pieces << 3 * shift)
+        cells |= pair & (pieces >> shift)
+        pair = (pieces >> shift) & (pieces >> 2 * shift)
+        cells |= pair & (pieces << shift)
+        cells |= pair & (pieces >> 3 * shift)
+    return cells & (BOARD_MASK ^ mask)
+
+
+@njit(cache=True)
+def non_losing_cells(position, mask):
+    possible = (mask + BOTTOM) & BOARD_MASK
+    opponent_win = winning_cells(position ^ mask, mask)
+    forced = possible & opponent_win
+    if forced:
+        if forced & (forced - 1):
+            return 0
+        possible = forced
+    return possible & ~(opponent_win >> 1)
+
+
+@njit(cache=True)
+def negamax(position, mask, age, alpha, beta, entries, order, min_score,
+            nodes, max_nodes):
+    """Solver._negamax, with the transposition table's packed entries, the
+    column order to break ties in and a one element node counter. Past
+    max_nodes the search unwinds without storing anything and the result is
+    meaningless"""
+    nodes[0] += 1
+    possible = non_losing_cells(position, mask)
+    if not possible:
+        return -((SIZE - age) // 2)
+    if age >= SIZE - 2:
+        return 0
+
+    low = -((SIZE - 2 - age) // 2)
+    if alpha < low:
+        alpha = low
+        if alpha >= beta:
+            return alpha
+    high = (SIZE - 1 - age) // 2
+    key = position + mask
+    i = key % entries.shape[0]
+    entry = entries[i]
+    if entry >> 8 == key and entry & 0xff:
+        high = (entry & 0xff) + min_score - 1
+    if beta > high:
+        beta = high
+        if alpha >= beta:
+            return beta
+
+    # insertion sort, most new winning cells first then in order
+    pieces = np.zeros(WIDTH, dtype=np.int64)
+    threats = np.zeros(WIDTH, dtype=np.int64)
+    n = 0
+    for col in order:
+        piece = possible & COLUMN[col]
+        if piece:
+            count = popcount(winning_cells(position | piece, mask | piece))
+            j = n
+            while j > 0 and threats[j - 1] < count:
+                pieces[j] = pieces[j - 1]
+                threats[j] = threats[j - 1]
+                j -= 1
+            pieces[j] = piece
+            threats[j] = count
+            n += 1
+
+    opponent = position ^ mask
+    for j in range(n):
+        score = -negamax(opponent, mask | pieces[j], age + 1, -beta, -alpha,
+                         entries, order, min_score, nodes, max_nodes)
+        if nodes[0] > max_nodes:
+            return 0
+        if score >= beta:
+            return score
+        if score > alpha:
+            alpha = score
+    entries[i] = key << 8 | (alpha - min_score + 1)
+    return alpha
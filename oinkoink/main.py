@@ -1,6 +1,8 @@
+from oinkoink.book import OpeningBook
 import oinkoink.evaluators as ev
 from oinkoink.match import Match
 from oinkoink.mcts import MCTS, MCTSConfig
+from oinkoink.perft import perft
 from oinkoink.player import HumanPlayer
 
 from oinkoink.neural.config import AlphaZeroConfig, ModelConfig
@@ -17,10 +19,11 @@ import sys
 class Parser():
     def __init__(self):
         parser = argparse.ArgumentParser(
-            description='Either play a game vs the AI or run the training loop',
-            usage='<game|training> [<args>]')
+            description='Either play a game vs the AI, run the training loop '
+            'or count positions with perft',
+            usage='<game|training|perft> [<args>]')
         parser.add_argument('-m', '--mode',
-                            choices=['game', 'training'],
+                            choices=['game', 'training', 'perft'],
                             help='What mode to run')
         self.mode = parser.parse_args(sys.argv[1:3])
 
@@ -42,7 +45,13 @@ class Parser():
                             default=800,
                             help='Number of positions the AI will evaluate each move.'
                             'Minimum value of 1')
+        parser.add_argument('-b', '--book', type=str, required=False,
+                            help='directory of an opening book to play '
+                            'from, made by build_book')
         self.args = parser.parse_args(sys.argv[3:])
+        if self.args.book is not None and \
+                not os.path.isdir(self.args.book):
+            raise FileNotFoundError('book incorrectly specified')
         if not os.path.isfile(self.args.net_filepath):
             raise FileNotFoundError('net_filepath incorrectly specified')
         if self.args.simulations <= 0:
@@ -54,6 +63,18 @@ class Parser():
                             help='An AlphaZero config filepath')
         self.args = parser.parse_args(sys.argv[3:])
 
+    def perft(self):
+        parser = argparse.ArgumentParser(
+            description='Count positions to a depth, timing move generation')
+        parser.add_argument('depth', type=int,
+                            help='Number of moves to look ahead')
+        parser.add_argument('-u', '--unique', action='store_true',
+                            help='Count each position once, however it '
+                            'was reached')
+        self.args = parser.parse_args(sys.argv[3:])
+        if self.args.depth < 0:
+            raise ValueError('Depth must be a non-negative integer')
+
 
 def main():
     parser = Parser()
@@ -62,13 +83,29 @@ def main():
         model = ModelWrapper(ModelConfig(use_gpu=False),
                              file_name=parser.args.net_filepath)
 
+        book = None if parser.args.book is None else \
+            OpeningBook.load(parser.args.book)
+
         player_2 = MCTS('AI',
                         MCTSConfig(simulations=parser.args.simulations),
                         ev.Evaluator(partial(ev.evaluate_nn,
-                                             model=model)))
+                                             model=model)),
+                        book=book,
+                        release_positions=True)
 
         match = Match(True, player_1, player_2, switch=True)
         match.play()
+    elif parser.mode.mode == 'perft':
+        result = perft(parser.args.depth, unique=parser.args.unique)
+        print(result)
+        expected = result.expected(parser.args.unique)
+        if expected is None:
+            print('No known value to check against')
+        elif expected != result.leaves:
+            print('Expected {} leaves'.format(expected))
+            sys.exit(1)
+        else:
+            print('Matches the known value')
     else:
         from torch.multiprocessing import set_start_method
         try:
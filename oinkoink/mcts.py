@@ -1,13 +1,15 @@
-from oinkoink.board import Board
-from oinkoink.evaluators import Evaluator
+from oinkoink.board import Board, SIZE
+from oinkoink.book import OpeningBook
+from oinkoink.evaluators import Evaluator, PositionTable
 from oinkoink.player import BasePlayer
+from oinkoink.solver import Solver, score_to_value
 from oinkoink.tree import Tree
-from oinkoink.utils import Connect4Stats as info
+from oinkoink.utils import Connect4Stats as info, value_to_side
 
 from anytree import Node
 import math
 import numpy as np
-from typing import Callable, List, Set, Tuple
+from typing import Callable, List, Optional, Set, Tuple
 
 
 class MCTSConfig():
@@ -17,13 +19,19 @@ class MCTSConfig():
                  pb_c_init: float = 1.25,
                  root_dirichlet_alpha: float = 0.0,
                  root_exploration_fraction: float = 0.0,
-                 num_sampling_moves=0):
+                 num_sampling_moves=0,
+                 solve_from_age: Optional[int] = None,
+                 solve_max_nodes: Optional[int] = 10000):
         self.simulations = simulations
         self.pb_c_base = pb_c_base
         self.pb_c_init = pb_c_init
         self.root_dirichlet_alpha = root_dirichlet_alpha
         self.root_exploration_fraction = root_exploration_fraction
         self.num_sampling_moves = num_sampling_moves
+        # leaves at least this old are solved exactly instead of evaluated,
+        # unless the solve takes more than solve_max_nodes nodes
+        self.solve_from_age = solve_from_age
+        self.solve_max_nodes = solve_max_nodes
 
 
 class PositionEvaluation():
@@ -67,16 +75,51 @@ class SearchEvaluation():
 
 
 class MCTS(BasePlayer):
+    """With release_positions, positions younger than each root are dropped
+    from the evaluator's table, once every player sharing it, told apart
+    by name, has a root past them"""
     def __init__(self,
                  name: str,
                  config: MCTSConfig,
-                 evaluator: Evaluator):
+                 evaluator: Evaluator,
+                 book: Optional[OpeningBook] = None,
+                 release_positions: bool = False):
         super().__init__(name)
         self.config = config
         self.evaluator = evaluator
+        self.book = book
+        self.release_positions = release_positions
+        self.solver = None if config.solve_from_age is None else Solver()
+        # value of each solved position by key, None if it was too hard,
+        # released below each root
+        self.solved = PositionTable()
+        self.root_age = 0
+
+    def solve(self, board: Board) -> Optional[float]:
+        if board.age < self.config.solve_from_age:
+            return None
+        solved = self.solved.buckets[board.age]
+        if board.key not in solved:
+            score = self.solver.solve(board, weak=True,
+                                      max_nodes=self.config.solve_max_nodes)
+            solved[board.key] = None if score is None else \
+                value_to_side(score_to_value(score), board.player_to_move)
+        return solved[board.key]
 
     def make_move(self, board):
-        tree = search(self.config, board, self.evaluator)
+        if self.release_positions:
+            self.evaluator.release_below(board.age, self.name)
+        # a root younger than the last is a new game, so release it all
+        self.solved.release_below(
+            SIZE + 1 if board.age < self.root_age else board.age)
+        self.root_age = board.age
+        if self.book is not None:
+            played = self.book.make_move(board)
+            if played is not None:
+                return played
+
+        tree = search(self.config, board, self.evaluator,
+                      None if self.solver is None else self.solve)
 
         if board.age < self.config.num_sampling_moves:
             child = tree.sample_value_fn(lambda x: x ** 2)
@@ -94,7 +137,9 @@ class MCTS(BasePlayer):
 def search(config: MCTSConfig,
            board: Board,
            evaluator: Callable[[Board],
-                               Tuple[float, List[float]]]):
+                               Tuple[float, List[float]]],
+           solve: Optional[Callable[[Board], Optional[float]]] = None):
+    """solve, if given, returns the exact value of a leaf or None"""
     tree = Tree(board)
 
     # First evaluate root and add noise
@@ -115,17 +160,26 @@ def search(config: MCTSConfig,
             tree.expand_node(node, 1)
             node = select_child(config, tree, node)
 
-        value = evaluate_node(tree, node, evaluator)
+        value = evaluate_node(tree, node, evaluator, solve)
 
         backpropagate(node, value)
     return tree
 
 
-def evaluate_node(tree: Tree, node: Node, evaluator):
+def evaluate_node(tree: Tree, node: Node, evaluator, solve=None):
+    if node.data.board.result is None and node.data.solved_value is None \
+            and solve is not None:
+        # solved nodes, like finished ones, are never expanded
+        node.data.solved_value = solve(node.data.board)
+
     if node.data.board.result is not None:
         value = node.data.board.result.value
         if node.data.search_value is None:
             node.data.search_value = SearchEvaluation()
+    elif node.data.solved_value is not None:
+        value = node.data.solved_value
+        if node.data.search_value is None:
+            node.data.search_value = SearchEvaluation()
     else:
         value, prior = evaluator(node.data.board)
         normalise(node.data.valid_moves, prior)
@@ -64,7 +64,15 @@ class AlphaZeroConfig():
                  n_training_games=1200,
                  use_pytorch=True,
                  enable_gpu=True,
-                 visdom_enabled=False):
+                 visdom_enabled=False,
+                 # end self-play games once a solve of at most
+                 # adjudicate_max_nodes proves the result
+                 adjudicate_from_age=None,
+                 adjudicate_max_nodes=100000,
+                 # MCTS solves leaves this old instead of evaluating them,
+                 # unless the solve takes more than solve_max_nodes
+                 solve_from_age=None,
+                 solve_max_nodes=10000):
         self.model_config = model_config
         self.storage_config = storage_config
         self.game_processes = game_processes
@@ -79,3 +87,7 @@ class AlphaZeroConfig():
         self.n_training_games = n_training_games
         self.use_pytorch = use_pytorch
         self.visdom_enabled = visdom_enabled
+        self.adjudicate_from_age = adjudicate_from_age
+        self.adjudicate_max_nodes = adjudicate_max_nodes
+        self.solve_from_age = solve_from_age
+        self.solve_max_nodes = solve_max_nodes
@@ -1,34 +1,43 @@
-from oinkoink.evaluators import Evaluator
+from oinkoink.evaluators import Evaluator, PositionTable
 from oinkoink.mcts import MCTS, MCTSConfig
 
 from oinkoink.neural.inference_server import evaluate_server_deque
-from oinkoink.neural.training_game import training_game
+from oinkoink.neural.training_game import Adjudicator, training_game
 
 from collections import deque
 from functools import partial
 from multiprocessing.connection import Connection
 from multiprocessing.pool import ThreadPool
 import os
-from typing import Dict, List, Tuple
+from typing import List, Optional, Tuple
 
 
 def game_pool(conn_list: List[Tuple[Connection, Connection]],
               n_threads: int,
               mcts_config: MCTSConfig,
-              n_games: int):
+              n_games: int,
+              adjudicate_from_age: Optional[int] = None,
+              adjudicate_max_nodes: int = 100000):
     assert n_threads == len(conn_list)
 
-    position_table: Dict[Tuple, Tuple] = {}
+    # each game's player releases it, below the youngest game in progress
+    position_table = PositionTable()
     conn_deque = deque([c[0] for c in conn_list])
 
     evaluator = Evaluator(partial(evaluate_server_deque,
                                   conn_deque=conn_deque),
                           position_table,
-                          store_position=True)
-
-    player_deque = deque([MCTS('AlphaZero:{}:{}'.format(os.getpid(), i),
-                               mcts_config,
-                               evaluator)
+                          store_position=True,
+                          mirror=True)
+
+    # each thread gets its own adjudicator, as a Solver isn't thread safe
+    player_deque = deque([(MCTS('AlphaZero:{}:{}'.format(os.getpid(), i),
+                                mcts_config,
+                                evaluator,
+                                release_positions=True),
+                           None if adjudicate_from_age is None else
+                           Adjudicator(adjudicate_from_age,
+                                       adjudicate_max_nodes))
                           for i in range(n_threads)])
 
     games = []
@@ -43,7 +52,7 @@ def game_pool(conn_list: List[Tuple[Connection, Connection]],
 
 
 def run_training_game(useless_int, player_deque: deque):
-    player = player_deque.pop()
-    results = training_game(player)
-    player_deque.append(player)
+    player, adjudicator = player_deque.pop()
+    results = training_game(player, adjudicator)
+    player_deque.append((player, adjudicator))
     return results
@@ -1,4 +1,4 @@
-from oinkoink.board import Board
+from oinkoink.board import Board, encode_boards
 
 from oinkoink.neural.storage import GameStorage
 from oinkoink.neural.training_game import GameData
@@ -82,24 +82,21 @@ def native_to_pytorch(boards: List[Board],
                       add_fliplr: bool = False):
     assert len(boards) == len(values)
 
+    boards_t = torch.from_numpy(encode_boards(boards))
+    values_t = torch.FloatTensor(values)
     if add_fliplr:
-        flip_boards = list(map(lambda x: x.create_fliplr(), boards))
-        boards.extend(flip_boards)
-        values = np.concatenate((values, values), axis=None)
-    boards_t = torch.FloatTensor(list(map(
-        lambda x: x.to_array(), boards)))
+        boards_t = torch.cat((boards_t, boards_t.flip(-1)))
+        values_t = torch.cat((values_t, values_t))
 
     if not to_move_channel:
         boards_t = boards_t[:, 1:]
-    values_t = torch.FloatTensor(values)
 
     if priors is None:
         priors_t = None
     else:
-        if add_fliplr:
-            flip_priors = list(map(lambda x: np.flip(x), priors))
-            priors.extend(flip_priors)
-        assert len(boards_t) == len(priors)
         priors_t = torch.FloatTensor(priors)
+        if add_fliplr:
+            priors_t = torch.cat((priors_t, priors_t.flip(-1)))
+        assert len(boards_t) == len(priors_t)
 
     return boards_t, values_t, priors_t
@@ -1,4 +1,4 @@
-from oinkoink.board import Board
+from oinkoink.board import Board, encode_boards
 from oinkoink.utils import Connect4Stats as info
 
 from oinkoink.neural.config import ModelConfig, NetConfig
@@ -250,8 +250,7 @@ class ModelWrapper():
             folder_path + '/net.pth')
 
     def _call_board(self, board: Board):
-        board_tensor = torch.FloatTensor(board.to_array())
-        board_tensor = board_tensor.view(1, *board_tensor.size())
+        board_tensor = torch.from_numpy(encode_boards([board]))
         board_tensor = board_tensor.to(self.device)
         value, prior = self.net(board_tensor)
 
@@ -267,8 +266,7 @@ class ModelWrapper():
         return value, prior
 
     def _call_list(self, board_list: List[Board]):
-        board_tensor = torch.FloatTensor(list(map(lambda x: x.to_array(),
-                                                  board_list)))
+        board_tensor = torch.from_numpy(encode_boards(board_list))
         board_tensor = board_tensor.to(self.device)
         values, priors = self.net(board_tensor)
 
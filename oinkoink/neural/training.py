@@ -6,7 +6,7 @@ from oinkoink.utils import Result
 from oinkoink.neural.config import AlphaZeroConfig
 from oinkoink.neural.game_pool import game_pool
 from oinkoink.neural.inference_server import InferenceServer
-from oinkoink.neural.training_game import training_game
+from oinkoink.neural.training_game import Adjudicator, training_game
 
 from oinkoink.neural.pytorch.model import ModelWrapper
 from oinkoink.neural.pytorch.data import Connect4Dataset, TrainingDataStorage
@@ -102,12 +102,17 @@ class TrainingLoop():
 
         if self.config.game_processes == 1:
             evaluator = evl.Evaluator(partial(evl.evaluate_nn,
-                                              model=self.model))
+                                              model=self.model),
+                                      mirror=True)
             alpha_zero = MCTS('AlphaZero',
                               mcts_config,
-                              evaluator)
+                              evaluator,
+                              release_positions=True)
+            adjudicator = None if self.config.adjudicate_from_age is None \
+                else Adjudicator(self.config.adjudicate_from_age,
+                                 self.config.adjudicate_max_nodes)
             for _ in range(self.config.n_training_games):
-                game_data = training_game(alpha_zero)
+                game_data = training_game(alpha_zero, adjudicator)
                 games.append(game_data)
         else:
             connections = [[Pipe() for
@@ -125,7 +130,9 @@ class TrainingLoop():
                         mcts_config=mcts_config,
                         n_threads=self.config.game_threads,
                         n_games=int(self.config.n_training_games /
-                                    self.config.game_processes)),
+                                    self.config.game_processes),
+                        adjudicate_from_age=self.config.adjudicate_from_age,
+                        adjudicate_max_nodes=self.config.adjudicate_max_nodes),
                                                       connections,
                                                       chunksize=1):
                     games.extend(game_batch)
@@ -139,6 +146,19 @@ class TrainingLoop():
             results.count(Result.o_win),
             results.count(Result.draw),
             results.count(Result.x_win)))
+        plies_saved = [g.plies_saved for g in games]
+        print('Dead draws: {} games ended early, saving {} plies and up to '
+              '{} evaluations'.format(
+                  sum(p > 0 for p in plies_saved),
+                  sum(plies_saved),
+                  sum(plies_saved) * self.config.simulations))
+        if self.config.adjudicate_from_age is not None:
+            plies_adjudicated = [g.plies_adjudicated for g in games]
+            print('Adjudicated: {} games ended early, saving up to {} plies '
+                  'and {} evaluations'.format(
+                      sum(g.adjudicated for g in games),
+                      sum(plies_adjudicated),
+                      sum(plies_adjudicated) * self.config.simulations))
 
         if self.config.visdom_enabled:
             self.vis.text(self.data_storage.last_game_str(),
@@ -213,11 +233,15 @@ class TrainingLoop():
                               self.config.pb_c_init,
                               self.config.root_dirichlet_alpha,
                               self.config.root_exploration_fraction,
-                              self.config.num_sampling_moves)
+                              self.config.num_sampling_moves,
+                              self.config.solve_from_age,
+                              self.config.solve_max_nodes)
         else:
             return MCTSConfig(self.config.simulations,
                               self.config.pb_c_base,
                               self.config.pb_c_init,
                               0.0,
                               0.0,
-                              0)
+                              0,
+                              self.config.solve_from_age,
+                              self.config.solve_max_nodes)
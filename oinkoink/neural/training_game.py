@@ -1,14 +1,46 @@
-from oinkoink.board import Board
+from oinkoink.board import Board, SIZE
 from oinkoink.player import BasePlayer
+from oinkoink.solver import Solver
+from oinkoink.utils import Result, Side
 
 from copy import copy
-from typing import List, Sequence
+from typing import List, Optional, Sequence
 
 
-def training_game(player: BasePlayer):
+class Adjudicator():
+    """Decides a game once a weak solve within max_nodes proves it"""
+    def __init__(self,
+                 from_age: int,
+                 max_nodes: int,
+                 solver: Optional[Solver] = None):
+        self.from_age = from_age
+        self.max_nodes = max_nodes
+        self.solver = Solver() if solver is None else solver
+
+    def __call__(self, board: Board) -> Optional[Result]:
+        if board.age < self.from_age:
+            return None
+        score = self.solver.solve(board, weak=True, max_nodes=self.max_nodes)
+        if score is None:
+            return None
+        if score == 0:
+            return Result.draw
+        o_wins = (score > 0) == (board.player_to_move == Side.o)
+        return Result.o_win if o_wins else Result.x_win
+
+
+def training_game(player: BasePlayer,
+                  adjudicator: Optional[Adjudicator] = None):
     board = Board()
     game_data = GameData()
     while board.result is None:
+        if adjudicator is not None:
+            result = adjudicator(board)
+            if result is not None:
+                # the values of the positions so far come from the result
+                game_data.result = result
+                game_data.adjudicated = True
+                return game_data
         board_copy = copy(board)
         move, value, tree = player.make_move(board)
         prior = tree.get_values_policy()
@@ -42,6 +74,7 @@ class TrainingData:
 class GameData():
     def __init__(self):
         self.result = None
+        self.adjudicated = False
         self.moves = []
         self.boards = []
         self.values = []
@@ -54,6 +87,20 @@ class GameData():
         self.values.append(value)
         self.priors.append(prior)
 
+    @property
+    def plies_saved(self):
+        """Plies not played because the game was a dead draw early"""
+        if self.result == Result.draw and not self.adjudicated:
+            return SIZE - len(self.moves)
+        return 0
+
+    @property
+    def plies_adjudicated(self):
+        """Most plies the game could have lasted after adjudication"""
+        if self.adjudicated:
+            return SIZE - len(self.moves)
+        return 0
+
     def create_training_values(self):
         # FIXME: TD(lambda) algorithm?
         # self.values = (np.array(self.values, dtype='float') + result.value) / 2.0
@@ -0,0 +1,105 @@
+from oinkoink.board import Board, WIDTH
+
+from copy import copy
+import time
+from typing import Optional
+
+
+# move sequences of each length from the empty board, games stop when won
+KNOWN_LEAVES = [1, 7, 49, 343, 2401, 16807, 117649, 823536, 5673234,
+                39394572]
+# distinct positions after each ply, finished games included
+KNOWN_POSITIONS = [1, 7, 49, 238, 1120, 4263, 16422, 54859, 184275,
+                   558186]
+
+
+class PerftResult():
+    def __init__(self,
+                 depth: int,
+                 leaves: int,
+                 terminal: int,
+                 nodes: int,
+                 seconds: float):
+        self.depth = depth
+        # positions at depth, or distinct positions when unique
+        self.leaves = leaves
+        # games finished at or before depth
+        self.terminal = terminal
+        # make_move calls
+        self.nodes = nodes
+        self.seconds = seconds
+
+    @property
+    def nodes_per_second(self):
+        return self.nodes / max(self.seconds, 1e-9)
+
+    def expected(self, unique: bool) -> Optional[int]:
+        known = KNOWN_POSITIONS if unique else KNOWN_LEAVES
+        return known[self.depth] if self.depth < len(known) else None
+
+    def __str__(self):
+        return "perft({}) leaves: {} terminal: {} nodes: {} " \
+            "in {:.2f}s ({:.0f} nodes/s)".format(
+                self.depth, self.leaves, self.terminal, self.nodes,
+                self.seconds, self.nodes_per_second)
+
+
+def perft(depth: int,
+          board: Optional[Board] = None,
+          unique: bool = False) -> PerftResult:
+    """Count the positions depth moves on from board (the empty board by
+    default). Finished games are counted as terminal and not extended.
+    With unique each position is counted once, however it was reached"""
+    board = Board() if board is None else board
+    start = time.perf_counter()
+    if unique:
+        leaves, terminal, nodes = _perft_unique(board, depth)
+    else:
+        leaves, terminal, nodes = _perft(board, depth)
+    return PerftResult(depth, leaves, terminal, nodes,
+                       time.perf_counter() - start)
+
+
+def _perft(board: Board, depth: int):
+    if depth == 0:
+        return 1, 0, 0
+    leaves = terminal = nodes = 0
+    for move in range(WIDTH):
+        if not board._isplayable(move):
+            continue
+        nodes += 1
+        # copy and play, as expanding a tree does
+        child = copy(board)
+        if child.make_move(move) is not None:
+            terminal += 1
+            leaves += depth == 1
+        else:
+            child_leaves, child_terminal, child_nodes = \
+                _perft(child, depth - 1)
+            leaves += child_leaves
+            terminal += child_terminal
+            nodes += child_nodes
+    return leaves, terminal, nodes
+
+
+def _perft_unique(board: Board, depth: int):
+    frontier = {board.key: board}
+    terminal = nodes = 0
+    for ply in range(depth):
+        children = {}
+        for parent in frontier.values():
+            for move in range(WIDTH):
+                if not parent._isplayable(move):
+                    continue
+                nodes += 1
+                child = copy(parent)
+                child.make_move(move)
+                if child.key in children:
+                    continue
+                children[child.key] = child
+                if child.result is not None:
+                    terminal += 1
+        # finished games are counted at this ply but not extended
+        frontier = children if ply == depth - 1 else \
+            {k: b for k, b in children.items() if b.result is None}
+    return len(frontier), terminal, nodes
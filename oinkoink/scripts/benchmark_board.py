@@ -0,0 +1,124 @@
+from oinkoink import kernels
+from oinkoink.archive.board_numpy import Board as NumpyBoard
+from oinkoink.board import (Board, BoardBatch, check_terminal_positions,
+                            encode_boards)
+
+from copy import copy
+from multiprocessing import Pipe
+import numpy as np
+import pickle
+import timeit
+
+
+# an 8 ply opening that doesn't finish the game
+MOVES = [3, 3, 2, 4, 4, 2, 5, 1]
+N = 20000
+
+
+def play(board_cls):
+    board = board_cls()
+    for move in MOVES:
+        board.make_move(move)
+    return board
+
+
+def play_batch(n):
+    batch = BoardBatch(n)
+    for move in MOVES:
+        batch.make_move(np.full((n,), move))
+    return batch
+
+
+def report(name, numpy_t, int_t, n):
+    print("{:<12} numpy: {:8.0f}/s  int: {:8.0f}/s  speedup: {:.1f}x".format(
+        name, n / numpy_t, n / int_t, numpy_t / int_t))
+
+
+if __name__ == "__main__":
+    numpy_t = timeit.timeit(lambda: play(NumpyBoard), number=N)
+    int_t = timeit.timeit(lambda: play(Board), number=N)
+    report('make_move', numpy_t, int_t, N * len(MOVES))
+
+    numpy_board, int_board = play(NumpyBoard), play(Board)
+    numpy_t = timeit.timeit(lambda: copy(numpy_board), number=N)
+    int_t = timeit.timeit(lambda: copy(int_board), number=N)
+    report('copy', numpy_t, int_t, N)
+
+    numpy_t = timeit.timeit(lambda: numpy_board.valid_moves, number=N)
+    int_t = timeit.timeit(lambda: int_board.valid_moves, number=N)
+    report('valid_moves', numpy_t, int_t, N)
+
+    numpy_t = timeit.timeit(lambda: hash(numpy_board), number=N)
+    int_t = timeit.timeit(lambda: hash(int_board), number=N)
+    report('hash', numpy_t, int_t, N)
+
+    batch_n = 10000
+    int_t = timeit.timeit(lambda: play(Board), number=batch_n // 10)
+    batch_t = timeit.timeit(lambda: play_batch(batch_n), number=10)
+    print("{:<12} Board: {:8.0f}/s  BoardBatch({}): {:8.0f}/s".format(
+        'batch moves',
+        batch_n // 10 * len(MOVES) / int_t,
+        batch_n,
+        10 * batch_n * len(MOVES) / batch_t))
+
+    numpy_boards = [play(NumpyBoard) for _ in range(1000)]
+    int_boards = [play(Board) for _ in range(1000)]
+    buffer = np.empty((len(int_boards), 3, 6, 7), dtype=np.float32)
+    numpy_t = timeit.timeit(
+        lambda: np.array([b.to_array() for b in numpy_boards],
+                         dtype=np.float32),
+        number=10)
+    int_t = timeit.timeit(lambda: encode_boards(int_boards, out=buffer),
+                          number=10)
+    print("{:<12} to_array: {:8.0f}/s  encode_boards: {:8.0f}/s  "
+          "speedup: {:.1f}x".format('encoding',
+                                    10 * len(numpy_boards) / numpy_t,
+                                    10 * len(int_boards) / int_t,
+                                    numpy_t / int_t))
+
+    numpy_size = len(pickle.dumps(numpy_board, pickle.HIGHEST_PROTOCOL))
+    int_size = len(pickle.dumps(int_board, pickle.HIGHEST_PROTOCOL))
+    send_conn, recv_conn = Pipe()
+
+    def round_trip(board):
+        send_conn.send(board)
+        return recv_conn.recv()
+
+    numpy_t = timeit.timeit(lambda: round_trip(numpy_board), number=N)
+    int_t = timeit.timeit(lambda: round_trip(int_board), number=N)
+    print("{:<12} numpy: {} bytes  int: {} bytes".format(
+        'pickle', numpy_size, int_size))
+    report('Pipe send', numpy_t, int_t, N)
+
+    if kernels.HAVE_NUMBA:
+        # compile before timing
+        kernels.play(0, 0, 0)
+        play_batch(10)
+        pieces = play_batch(batch_n).mask
+        check_terminal_positions(pieces)
+
+        def play_kernel():
+            position, mask = 0, 0
+            for move in MOVES:
+                position, mask = kernels.play(position, mask, move)
+                kernels.is_win(position ^ mask)
+            return position, mask
+
+        int_t = timeit.timeit(lambda: play(Board), number=N)
+        numba_t = timeit.timeit(play_kernel, number=N)
+        print("{:<12} Board: {:8.0f}/s  numba: {:8.0f}/s".format(
+            'make_move', N * len(MOVES) / int_t, N * len(MOVES) / numba_t))
+
+        timings = {}
+        for numba in (False, True):
+            kernels.HAVE_NUMBA = numba
+            timings[numba] = (
+                timeit.timeit(lambda: check_terminal_positions(pieces),
+                              number=100),
+                timeit.timeit(lambda: play_batch(batch_n), number=10))
+        print("{:<12} numpy: {:8.0f}/s  numba: {:8.0f}/s".format(
+            'terminal', 100 * batch_n / timings[False][0],
+            100 * batch_n / timings[True][0]))
+        print("{:<12} numpy: {:8.0f}/s  numba: {:8.0f}/s".format(
+            'batch moves', 10 * batch_n * len(MOVES) / timings[False][1],
+            10 * batch_n * len(MOVES) / timings[True][1]))
@@ -0,0 +1,78 @@
+from oinkoink.board import Board
+import oinkoink.evaluators as ev
+from oinkoink.grid_search import GridSearch
+from oinkoink.neural.config import ModelConfig
+from oinkoink.neural.pytorch.model import ModelWrapper
+
+from copy import copy
+import os
+import time
+import torch
+
+
+# an untrained net on the CPU, which costs as much to run as a trained one
+MOVES = '4453'
+PLIES = [2, 3, 4]
+# root split searches with evaluate_centre
+PARALLEL_PLIES = 9
+
+
+def time_move(model, plies, prefetch_plies):
+    calls = []
+
+    def evaluate(board):
+        calls.append(1)
+        return ev.evaluate_nn(board, model)
+
+    def evaluate_batch(boards):
+        calls.append(len(boards))
+        return ev.evaluate_nn_batch(boards, model)
+
+    evaluator = ev.Evaluator(evaluate, mirror=True,
+                             evaluate_batch_fn=evaluate_batch)
+    player = GridSearch('grid', plies, evaluator,
+                        prefetch_plies=prefetch_plies)
+    start = time.perf_counter()
+    move, value, _ = player.make_move(copy(Board.from_moves(MOVES)))
+    return time.perf_counter() - start, len(calls), sum(calls), move, value
+
+
+def time_parallel(processes, split_plies=1):
+    player = GridSearch('grid', PARALLEL_PLIES,
+                        ev.Evaluator(ev.evaluate_centre),
+                        processes=processes, split_plies=split_plies)
+    # includes starting the pool
+    start = time.perf_counter()
+    move, value, _ = player.make_move(copy(Board.from_moves(MOVES)))
+    seconds = time.perf_counter() - start
+    return seconds, move, value
+
+
+if __name__ == "__main__":
+    model = ModelWrapper(ModelConfig(use_gpu=False))
+    with torch.no_grad():
+        # warm up
+        time_move(model, 1, 0)
+        for plies in PLIES:
+            for prefetch_plies in sorted({0, 1, 2, plies}):
+                seconds, n_calls, n_boards, move, value = time_move(
+                    model, plies, prefetch_plies)
+                print("plies: {} prefetch_plies: {}  {:7.3f}s  {:5} calls "
+                      "{:6} positions  move: {} value: {:.4f}".format(
+                          plies, prefetch_plies, seconds, n_calls,
+                          n_boards, move, value))
+
+    serial_t, move, value = time_parallel(1)
+    print("plies: {} processes: 1  {:7.3f}s  move: {} value: {:.4f}".format(
+        PARALLEL_PLIES, serial_t, move, value))
+    cores = os.cpu_count()
+    for split_plies in (1, 2):
+        for processes in sorted({2, 7, cores} - {1}):
+            seconds, move, value = time_parallel(processes, split_plies)
+            speedup = serial_t / seconds
+            print("plies: {} processes: {} split_plies: {}  {:7.3f}s  "
+                  "move: {} value: {:.4f}  speedup: {:.2f}x  "
+                  "efficiency: {:.0%} on {} cores".format(
+                      PARALLEL_PLIES, processes, split_plies, seconds, move,
+                      value, speedup, speedup / min(processes, cores),
+                      cores))
@@ -0,0 +1,154 @@
+from oinkoink.board import Board
+from oinkoink.evaluators import Evaluator, PositionTable
+
+from copy import copy, deepcopy
+import numpy as np
+import sys
+import timeit
+
+
+# positions of random games, as a generation of self play fills the table
+GAMES = 20000
+N = 5
+# a game of searches, each reaching LINES random lines DEPTH plies deep
+SEARCH_GAMES = 20
+LINES = 200
+DEPTH = 8
+
+
+def random_positions(n_games, seed=0):
+    rng = np.random.default_rng(seed)
+    positions = {}
+    for _ in range(n_games):
+        board = Board()
+        while board.result is None:
+            board.make_move(int(rng.choice(sorted(board.valid_moves))))
+            positions[board.key] = board.age
+    return list(positions.items())
+
+
+def search_boards(n_games, seed=0):
+    """For each move of each game, the root's age and the boards its
+    search evaluates"""
+    rng = np.random.default_rng(seed)
+    games = []
+    for _ in range(n_games):
+        board = Board()
+        moves = []
+        while board.result is None:
+            boards = []
+            for _ in range(LINES):
+                leaf = copy(board)
+                for _ in range(DEPTH):
+                    if leaf.result is not None:
+                        break
+                    leaf.make_move(int(rng.choice(sorted(leaf.valid_moves))))
+                    boards.append(copy(leaf))
+            moves.append((board.age, boards))
+            board.make_move(int(rng.choice(sorted(board.valid_moves))))
+        games.append(moves)
+    return games
+
+
+class DictEvaluator(Evaluator):
+    """Evaluator as it was, on one dict"""
+    def __init__(self, evaluate_fn):
+        super().__init__(evaluate_fn)
+        self.table = {}
+
+    def __call__(self, board):
+        position_eval = self.table.get(board.key)
+        if position_eval is None:
+            position_eval = self.evaluate_fn(board)
+            self.table[board.key] = position_eval
+        return deepcopy(position_eval)
+
+
+def play(evaluator, moves):
+    """Most memory the evaluator's table takes during the game"""
+    most = 0
+    for age, boards in moves:
+        evaluator.release_below(age)
+        for board in boards:
+            evaluator(board)
+        if isinstance(evaluator, DictEvaluator):
+            size = dict_size(evaluator.table)
+        else:
+            size = sum(dict_size(b) for b in evaluator.position_table.buckets)
+        most = max(most, size)
+    return most
+
+
+def dict_size(d):
+    return sys.getsizeof(d)
+
+
+def fill_dict(positions, value):
+    table = {}
+    for key, _ in positions:
+        table[key] = value
+    return table
+
+
+def fill_buckets(positions, value):
+    table = PositionTable()
+    buckets = table.buckets
+    for key, age in positions:
+        buckets[age][key] = value
+    return table
+
+
+if __name__ == "__main__":
+    positions = random_positions(GAMES)
+    value = (0.5, np.ones(7) / 7)
+    print("{} positions".format(len(positions)))
+
+    plain = fill_dict(positions, value)
+    buckets = fill_buckets(positions, value)
+    plain_t = min(timeit.repeat(lambda: fill_dict(positions, value),
+                                number=1, repeat=N))
+    buckets_t = min(timeit.repeat(lambda: fill_buckets(positions, value),
+                                  number=1, repeat=N))
+    print("{:<8} dict: {:8.0f}/s  PositionTable: {:8.0f}/s".format(
+        'insert', len(positions) / plain_t, len(positions) / buckets_t))
+
+    plain_t = min(timeit.repeat(
+        lambda: [plain.get(k) for k, _ in positions], number=1, repeat=N))
+    lists = buckets.buckets
+    buckets_t = min(timeit.repeat(
+        lambda: [lists[a].get(k) for k, a in positions], number=1,
+        repeat=N))
+    print("{:<8} dict: {:8.0f}/s  PositionTable: {:8.0f}/s".format(
+        'lookup', len(positions) / plain_t, len(positions) / buckets_t))
+
+    print("{:<8} dict: {:8.0f}kB  PositionTable: {:8.0f}kB".format(
+        'memory', dict_size(plain) / 1024,
+        sum(dict_size(b) for b in buckets.buckets) / 1024))
+
+    # a game at its 20th move can't reach the first 20 plies again
+    release_t = timeit.timeit(lambda: buckets.release_below(20), number=1)
+    print("{:<8} release_below(20): {:.1f}us, {:8.0f}kB left".format(
+        'release', release_t * 1e6,
+        sum(dict_size(b) for b in buckets.buckets) / 1024))
+
+    # one evaluator per game, whose root moves forward every ply
+    games = search_boards(SEARCH_GAMES)
+    boards = [b for moves in games for _, bs in moves for b in bs]
+    plain = DictEvaluator(lambda board: value)
+    table = Evaluator(lambda board: value)
+    for board in boards:
+        plain(board)
+        table(board)
+    plain_t = min(timeit.repeat(lambda: [plain(b) for b in boards],
+                                number=1, repeat=N))
+    table_t = min(timeit.repeat(lambda: [table(b) for b in boards],
+                                number=1, repeat=N))
+    print("{:<8} dict: {:8.0f}/s  PositionTable: {:8.0f}/s".format(
+        'evaluate', len(boards) / plain_t, len(boards) / table_t))
+
+    plain_kb = max(play(DictEvaluator(lambda board: value), moves)
+                   for moves in games) / 1024
+    table_kb = max(play(Evaluator(lambda board: value), moves)
+                   for moves in games) / 1024
+    print("{:<8} dict: {:8.0f}kB  PositionTable: {:8.0f}kB  most in a game, "
+          "releasing below each root".format('game', plain_kb, table_kb))
@@ -0,0 +1,57 @@
+from oinkoink import kernels
+from oinkoink.board import BoardBatch, Board, generate_positions
+from oinkoink.solver import ParallelSolver, Solver, evaluate_solver
+
+import numpy as np
+import os
+import sys
+import time
+
+
+# solves positions sampled from every 7 and 8 ply position, or the first
+# rows of the UCI connect-4.data file if its path is given, checking the
+# results against its labels
+N = 5
+
+
+def time_solves(name, boards, weak, values=None, solver=None):
+    solver = Solver() if solver is None else solver
+    start = time.perf_counter()
+    results = [evaluate_solver(b, solver, weak) if values is not None
+               else solver.solve(b, weak) for b in boards]
+    seconds = time.perf_counter() - start
+    print("{:<14} {:6.3f}s/position  {:9.0f} nodes/s".format(
+        name, seconds / len(boards), solver.nodes / seconds))
+    if values is not None:
+        wrong = sum(r != v for r, v in zip(results, values))
+        print("{:<14} {} of {} disagree with the labels".format(
+            '', wrong, len(boards)))
+    return seconds, results
+
+
+def time_parallel(name, boards, weak):
+    seconds, scores = time_solves(name, boards, weak)
+    processes = max(os.cpu_count(), 2)
+    with ParallelSolver(processes) as solver:
+        parallel_seconds, parallel_scores = time_solves(
+            '{} x{}'.format(name, processes), boards, weak, solver=solver)
+    assert parallel_scores == scores
+    print("{:<14} speedup: {:.2f}x on {} cores".format(
+        '', seconds / parallel_seconds, os.cpu_count()))
+
+
+if __name__ == "__main__":
+    print("numba: {}".format(kernels.HAVE_NUMBA))
+    # compile before timing
+    Solver(table_size=1021).solve(Board.from_moves('4' * 6 + '3' * 6 + '5'))
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            batch, values = BoardBatch.from_uci(f.read().splitlines()[:N])
+        time_solves('UCI 8 ply weak', batch.to_boards(), True, values)
+    else:
+        rng = np.random.default_rng(0)
+        for plies in (7, 8):
+            keys = rng.choice(generate_positions(plies), N, replace=False)
+            boards = [Board.from_key(int(k)) for k in keys]
+            time_parallel('{} ply weak'.format(plies), boards, True)
+            time_parallel('{} ply strong'.format(plies), boards, False)
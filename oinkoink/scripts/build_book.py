@@ -0,0 +1,27 @@
+from oinkoink.book import build_book
+
+import argparse
+import time
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Solve every position up to a number of plies into an '
+        'opening book')
+    parser.add_argument('plies', type=int)
+    parser.add_argument('path', type=str,
+                        help='directory to save the book in')
+    parser.add_argument('-w', '--weak', action='store_true',
+                        help='only decide win, draw or loss')
+    parser.add_argument('-p', '--processes', type=int, default=1)
+    parser.add_argument('-t', '--table', type=str,
+                        help='solver transposition table file, kept '
+                        'between builds')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    book = build_book(args.plies, args.weak, args.processes,
+                      table_path=args.table)
+    book.save(args.path)
+    print("{} positions in {:.0f}s".format(len(book),
+                                           time.perf_counter() - start))
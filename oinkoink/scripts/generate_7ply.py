@@ -1,5 +1,4 @@
-import oinkoink.evaluators as ev
-from oinkoink.grid_search import GridSearch
+from oinkoink.solver import MappedTranspositionTable, Solver, evaluate_solver
 from oinkoink.utils import Side
 
 from oinkoink.neural.pytorch.data import Connect4Dataset, native_to_pytorch
@@ -11,10 +10,6 @@ import numpy as np
 import pickle
 
 
-def return_half(x):
-    return 0.5
-
-
 DATA_DIR = '/home/richard/data/connect4'
 
 if __name__ == '__main__':
@@ -36,50 +31,32 @@ if __name__ == '__main__':
     print("len of table at start: {}".format(len(table)))
     ten_percent = int(len(board_ips) / 10)
 
-    evaluator = ev.Evaluator(return_half)
-    player_1 = GridSearch("1",
-                          1,
-                          evaluator)
-    player_2 = GridSearch("2",
-                          2,
-                          evaluator)
+    # bounds from previous runs are kept in the table file
+    solver_table = MappedTranspositionTable(DATA_DIR + '/solver_table.bin')
+    solver = Solver(table=solver_table)
 
     boards = []
     values = []
     priors = []
-    unknown = []
     for i, board in enumerate(board_ips):
         if i % ten_percent == 0:
             print(i)
         to_move = board.player_to_move
-        undetermined = False
         moves = np.zeros((7,))
         valid_moves = board.valid_moves
         for move in valid_moves:
-            new_board = copy(board)
-            new_board.make_move(move)
-            value = table.get(new_board)
-            if value is None:
-                value = new_board.result
+            with board.move_stack(move):
+                value = table.get(board)
                 if value is None:
-                    # Now we look into whether the resulting 8 ply position has a trivial solution
-                    _, value, _ = player_1.make_move(
-                        copy(new_board))
-                    if value == 0.5:
-                        _, value, _ = player_2.make_move(
-                            copy(new_board))
-                        if value == 0.5:
-                            unknown.append(board)
-                            undetermined = True
-                            break
-                    value = float(int(np.round(value)))
-                    table[new_board] = value
-                    table[new_board.create_fliplr()] = value
-                else:
-                    value = new_board.result.value
+                    value = board.result
+                    if value is None:
+                        # solve the resulting 8 ply position
+                        value = evaluate_solver(board, solver)
+                        table[copy(board)] = value
+                        table[board.create_fliplr()] = value
+                    else:
+                        value = board.result.value
             moves[move] = value
-        if undetermined:
-            continue
         value = np.max(moves) if to_move == Side.o else np.min(moves)
         # if there is no winning move, we want to set the prior to be any
         # legal move
@@ -93,9 +70,9 @@ if __name__ == '__main__':
         values.append(value)
         priors.append(prior)
 
+    solver_table.close()
     print("Finished: {} {} {}".format(len(boards), len(values), len(priors)))
     print("{} known 8ply non-terminal positions".format(len(table)))
-    print("{} unknown (prior, not necessarily value) 7ply non-terminal positions".format(len(unknown)))
     with open(DATA_DIR + '/8ply_table.pkl', 'wb') as f:
         pickle.dump(table, f)
     with open(DATA_DIR + '/7ply_boards.pkl', 'wb') as f:
@@ -104,8 +81,6 @@ if __name__ == '__main__':
         pickle.dump(values, f)
     with open(DATA_DIR + '/7ply_priors.pkl', 'wb') as f:
         pickle.dump(priors, f)
-    with open(DATA_DIR + '/7ply_unknown_boards.pkl', 'wb') as f:
-        pickle.dump(unknown, f)
 
     board_t, value_t, prior_t = native_to_pytorch(boards, values, priors)
     data_7ply = Connect4Dataset(board_t, value_t, prior_t)
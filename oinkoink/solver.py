@@ -0,0 +1,394 @@
+from oinkoink import kernels
+from oinkoink.board import (Board, COLUMN, HEIGHT, SIZE, WIDTH,
+                            non_losing_cells, possible_cells, popcount,
+                            winning_cells)
+from oinkoink.player import BasePlayer
+from oinkoink.tree import Tree
+from oinkoink.utils import value_to_side
+
+from array import array
+import mmap
+from multiprocessing import Process, Queue, shared_memory
+import numpy as np
+import os
+from queue import Empty
+import struct
+from typing import List, Optional, Sequence
+
+
+# Scores follow http://blog.gamesolver.org: for the player to move, a win
+# with their n-th remaining piece scores (SIZE + 1 - age) // 2 - n + 1,
+# a loss the negative of the opponent's win, and a draw 0
+MIN_SCORE = -(SIZE // 2) + 3
+# columns from the centre out, the order moves are tried in
+CENTRE_ORDER = sorted(range(WIDTH), key=lambda c: (abs(2 * c - WIDTH + 1), c))
+# a prime, so keys spread evenly over the table
+TABLE_SIZE = (1 << 20) + 7
+_NO_LIMIT = 1 << 62
+# MappedTranspositionTable files start with magic, version, width, height
+# and size. Bump the version whenever the entry layout or scores change
+TABLE_MAGIC = b'OKTT'
+TABLE_VERSION = 1
+_HEADER = struct.Struct('<4sIIIQ')
+# how often ParallelSolver checks its workers are still alive
+_POLL_SECONDS = 1.0
+
+
+class TranspositionTable():
+    """Fixed size hash table of key -> upper bound, overwriting on
+    collision. Each entry packs key << 8 | value into one word, so a reader
+    never sees the key of one write with the value of another. A stored
+    value of 0 means empty"""
+    def __init__(self, size: int = TABLE_SIZE, buffer=None):
+        self.size = size
+        self.entries = array('Q', bytes(8 * size)) if buffer is None \
+            else memoryview(buffer).cast('Q')
+
+    def put(self, key: int, value: int):
+        self.entries[key % self.size] = key << 8 | value
+
+    def get(self, key: int) -> int:
+        entry = self.entries[key % self.size]
+        return entry & 0xff if entry >> 8 == key else 0
+
+    def clear(self):
+        self.as_array()[:] = 0
+
+    def as_array(self) -> np.ndarray:
+        """The entries as the int64 array the kernels take"""
+        return np.frombuffer(self.entries, dtype=np.int64, count=self.size)
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """A TranspositionTable in shared memory, created when name is None,
+    else attached to by name. Entries are single aligned words, so
+    processes read and write without locks and a lost race only costs a
+    table miss"""
+    def __init__(self, size: int = TABLE_SIZE, name: Optional[str] = None):
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner,
+                                              size=8 * size)
+        super().__init__(size, self.shm.buf)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def close(self):
+        self.entries.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class MappedTranspositionTable(TranspositionTable):
+    """A TranspositionTable in a memory mapped file, so later runs start
+    with the bounds earlier ones found. size defaults to the file's, or
+    TABLE_SIZE for a new file, and bounds the file at 8 bytes an entry.
+    A file of another size is rehashed into size entries, and one from
+    another version or board size is started afresh. Processes can map
+    the same file and share it as they would a SharedTranspositionTable"""
+    def __init__(self, path: str, size: Optional[int] = None):
+        old = _read_table(path)
+        size = (TABLE_SIZE if old is None else len(old)) if size is None \
+            else size
+        if size < 1:
+            raise ValueError("table size must be positive, not {}".format(
+                size))
+        if old is None or len(old) != size:
+            with open(path, 'wb') as f:
+                f.write(_HEADER.pack(TABLE_MAGIC, TABLE_VERSION, WIDTH,
+                                     HEIGHT, size))
+                f.truncate(_HEADER.size + 8 * size)
+        with open(path, 'r+b') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0)
+        super().__init__(size, memoryview(self.mmap)[_HEADER.size:])
+        if old is not None and len(old) != size:
+            old = old[old & 0xff != 0]
+            self.as_array()[(old >> 8) % size] = old.view(np.int64)
+
+    def close(self):
+        self.entries.release()
+        self.mmap.flush()
+        self.mmap.close()
+
+
+def _read_table(path: str) -> Optional[np.ndarray]:
+    """The entries of the table file at path, None if there is no usable
+    one"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        header = f.read(_HEADER.size)
+    if len(header) < _HEADER.size or header[:4] != TABLE_MAGIC:
+        raise ValueError("{} is not a transposition table".format(path))
+    _, version, width, height, size = _HEADER.unpack(header)
+    if (version, width, height) != (TABLE_VERSION, WIDTH, HEIGHT) or \
+            os.path.getsize(path) != _HEADER.size + 8 * size:
+        return None
+    return np.fromfile(path, dtype=np.uint64, offset=_HEADER.size)
+
+
+class Solver():
+    def __init__(self,
+                 table_size: int = TABLE_SIZE,
+                 table: Optional[TranspositionTable] = None,
+                 order: Sequence[int] = CENTRE_ORDER):
+        self.table = TranspositionTable(table_size) if table is None \
+            else table
+        # tie break between moves making as many threats
+        self.order = tuple(order)
+        self.nodes = 0
+        self.max_nodes = 0
+
+    def solve(self,
+              board: Board,
+              weak: bool = False,
+              max_nodes: Optional[int] = None) -> Optional[int]:
+        """Score of board for the player to move. With weak only the sign,
+        i.e. win, draw or loss, is exact. Returns None if the search needs
+        more than max_nodes nodes"""
+        if board.result is not None:
+            # the opponent won with their last move, or it is a draw
+            return 0 if board.result.value == 0.5 else \
+                -((SIZE + 2 - board.age) // 2)
+        position, mask, age = board.position, board.mask, board.age
+        if winning_cells(position, mask) & possible_cells(mask):
+            return (SIZE + 1 - age) // 2
+        low, high = -((SIZE - age) // 2), (SIZE + 1 - age) // 2
+        if weak:
+            low, high = -1, 1
+        start = self.nodes
+        self.max_nodes = _NO_LIMIT if max_nodes is None else start + max_nodes
+        # null window searches, closing in on the score from both sides
+        while low < high:
+            med = low + (high - low) // 2
+            if med <= 0 and int(low / 2) < med:
+                med = int(low / 2)
+            elif med >= 0 and int(high / 2) > med:
+                med = int(high / 2)
+            if kernels.HAVE_NUMBA:
+                nodes = np.zeros(1, dtype=np.int64)
+                score = kernels.negamax(
+                    position, mask, age, med, med + 1, self.table.as_array(),
+                    np.array(self.order, dtype=np.int64),
+                    MIN_SCORE, nodes, self.max_nodes - self.nodes)
+                self.nodes += int(nodes[0])
+            else:
+                score = self._negamax(position, mask, age, med, med + 1)
+            if self.nodes > self.max_nodes:
+                return None
+            if score <= med:
+                high = score
+            else:
+                low = score
+        return low
+
+    def analyze(self, board: Board, weak: bool = False) \
+            -> List[Optional[int]]:
+        """Score of each move for the player to move, None if invalid"""
+        scores = [None] * WIDTH
+        for move, _, win, draw in board.children():
+            if win:
+                scores[move] = (SIZE + 1 - board.age) // 2
+            else:
+                scores[move] = -self.solve(board.child(move, win, draw),
+                                           weak)
+        return scores
+
+    def _negamax(self, position, mask, age, alpha, beta):
+        # the player to move can't win with this move
+        self.nodes += 1
+        possible = non_losing_cells(position, mask)
+        if not possible:
+            return -((SIZE - age) // 2)
+        if age >= SIZE - 2:
+            return 0
+
+        low = -((SIZE - 2 - age) // 2)
+        if alpha < low:
+            alpha = low
+            if alpha >= beta:
+                return alpha
+        high = (SIZE - 1 - age) // 2
+        key = position + mask
+        stored = self.table.get(key)
+        if stored:
+            high = stored + MIN_SCORE - 1
+        if beta > high:
+            beta = high
+            if alpha >= beta:
+                return beta
+
+        # most new winning cells first, ties in self.order
+        moves = []
+        for col in self.order:
+            piece = possible & COLUMN[col]
+            if piece:
+                threats = popcount(winning_cells(position | piece,
+                                                 mask | piece))
+                moves.append((-threats, len(moves), piece))
+        moves.sort()
+
+        opponent = position ^ mask
+        for _, _, piece in moves:
+            score = -self._negamax(opponent, mask | piece, age + 1,
+                                   -beta, -alpha)
+            if self.nodes > self.max_nodes:
+                return 0
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        self.table.put(key, alpha - MIN_SCORE + 1)
+        return alpha
+
+
+class ParallelSolver(Solver):
+    """Lazy SMP: processes workers solve the same position, each trying
+    moves in a different order, sharing one transposition table. The bounds
+    one worker stores let the others skip those subtrees, and the first to
+    finish gives the score. Bounded solves run in this process alone.
+    RuntimeError is raised if every worker fails or dies"""
+    def __init__(self,
+                 processes: Optional[int] = None,
+                 table_size: int = TABLE_SIZE):
+        super().__init__(table=SharedTranspositionTable(table_size))
+        self.processes = os.cpu_count() if processes is None else processes
+        # the first worker keeps to the centre order, the rest are shuffled
+        rng = np.random.default_rng(0)
+        self.orders = [tuple(CENTRE_ORDER)] + [
+            tuple(int(c) for c in rng.permutation(WIDTH))
+            for _ in range(self.processes - 1)]
+
+    def solve(self,
+              board: Board,
+              weak: bool = False,
+              max_nodes: Optional[int] = None) -> Optional[int]:
+        if self.processes == 1 or max_nodes is not None:
+            return super().solve(board, weak, max_nodes)
+        results = Queue()
+        workers = [Process(target=_solve_worker,
+                           args=(self.table.name, self.table.size, order,
+                                 board, weak, results),
+                           daemon=True)
+                   for order in self.orders]
+        for worker in workers:
+            worker.start()
+        try:
+            score, nodes = _first_result(workers, results)
+        finally:
+            for worker in workers:
+                worker.terminate()
+                worker.join()
+        self.nodes += nodes
+        return score
+
+    def close(self):
+        self.table.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _solve_worker(name: str,
+                  size: int,
+                  order: Sequence[int],
+                  board: Board,
+                  weak: bool,
+                  results: Queue):
+    table = SharedTranspositionTable(size, name)
+    solver = Solver(table=table, order=order)
+    try:
+        results.put((solver.solve(board, weak), solver.nodes, None))
+    except Exception as e:
+        results.put((None, solver.nodes, repr(e)))
+    finally:
+        table.close()
+
+
+def _first_result(workers: List[Process], results: Queue):
+    """The score and nodes of the first worker to succeed"""
+    errors = []
+    while len(errors) < len(workers):
+        # checked before waiting, as a worker's result is in the queue
+        # before it exits
+        alive = any(worker.is_alive() for worker in workers)
+        try:
+            score, nodes, error = results.get(timeout=_POLL_SECONDS)
+        except Empty:
+            if alive:
+                continue
+            raise RuntimeError('solve workers exited without a result, '
+                               'exit codes {}'.format(
+                                   [worker.exitcode for worker in workers]))
+        if error is None:
+            return score, nodes
+        errors.append(error)
+    raise RuntimeError('every solve worker failed: {}'.format(errors[0]))
+
+
+def score_to_value(score: int) -> float:
+    """The value of a score to the player to move"""
+    return 0.5 if score == 0 else 1.0 if score > 0 else 0.0
+
+
+def best_move(scores: List[Optional[int]]) -> int:
+    """The move with the best score, the most central on ties"""
+    return max((c for c in CENTRE_ORDER if scores[c] is not None),
+               key=lambda c: scores[c])
+
+
+def scored_tree(board: Board, scores: List[Optional[int]]) -> Tree:
+    """A 1 ply tree holding the value of each move's score as its
+    solved_value"""
+    side = board.player_to_move
+    tree = Tree(board)
+    tree.expand_node(tree.root, 1)
+    for child in tree.root.children:
+        child.data.solved_value = value_to_side(
+            score_to_value(scores[child.name]), side)
+    return tree
+
+
+class SolverPlayer(BasePlayer):
+    def __init__(self,
+                 name: str,
+                 solver: Optional[Solver] = None,
+                 weak: bool = False):
+        super().__init__(name)
+        self.solver = Solver() if solver is None else solver
+        self.weak = weak
+
+    def make_move(self, board):
+        scores = self.solver.analyze(board, self.weak)
+        move = best_move(scores)
+        tree = scored_tree(board, scores)
+        value = value_to_side(score_to_value(scores[move]),
+                              board.player_to_move)
+        board.make_move(move)
+        return move, value, tree
+
+    def __str__(self):
+        return super().__str__() + ", type: Solver"
+
+
+def evaluate_solver(board: Board,
+                    solver: Solver,
+                    weak: bool = True) -> float:
+    return value_to_side(score_to_value(solver.solve(board, weak)),
+                         board.player_to_move)
+
+
+def evaluate_solver_with_prior(board: Board,
+                               solver: Solver,
+                               weak: bool = True):
+    """Value, and a prior spread evenly over the best moves"""
+    scores = solver.analyze(board, weak)
+    best = max(s for s in scores if s is not None)
+    prior = np.array([1.0 if s == best else 0.0 for s in scores])
+    value = value_to_side(score_to_value(best), board.player_to_move)
+    return value, prior / np.sum(prior)
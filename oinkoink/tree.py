@@ -23,11 +23,15 @@ class NodeData():
         self.valid_moves = board.valid_moves
         self.position_value = None
         self.search_value = None
+        # exact value from a solver
+        self.solved_value = None
 
     @property
     def absolute_value(self):
         if self.board.result is not None:
             return self.board.result.value
+        elif self.solved_value is not None:
+            return self.solved_value
         elif self.search_value is not None:
             return float(self.search_value)
         elif self.position_value is not None:
@@ -109,10 +113,11 @@ class Tree():
         return policy
 
     def get_visit_count_policy(self):
+        """Uniform for trees of values alone, such as GridSearch's, which
+        have no visit counts"""
         policy = np.zeros((info.width,))
         for c in self.root.children:
-            if c.data.search_value is not None:
-                policy[c.name] = c.data.search_value.visit_count
+            policy[c.name] = getattr(c.data.search_value, 'visit_count', 0)
         self._normalise_policy(policy)
         return policy
 
@@ -123,10 +128,10 @@ class Tree():
             return
 
         if not node.children:
-            for move in node.data.valid_moves:
-                new_board = copy(node.data.board)
-                new_board.make_move(move)
-                child = self._create_node(move, new_board, parent=node)
+            board = node.data.board
+            for move, _, win, draw in board.children():
+                self._create_node(move, board.child(move, win, draw),
+                                  parent=node)
 
         for child in node.children:
             self.expand_node(child, plies - 1)
@@ -23,7 +23,7 @@ setup(
         '*archive',
         'oinkoink/scripts'
     ]),
-    python_requires='>=3.7',
+    python_requires='>=3.8',
     install_requires=[
         'anytree',
         'matplotlib',
@@ -35,6 +35,7 @@ setup(
     ],
     extras_require={
         'test': ['coverage'],
+        'numba': ['numba'],
     },
     package_data={
         'oinkoink': ['data/*'],
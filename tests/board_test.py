@@ -1,10 +1,18 @@
-from oinkoink.board import Board
+from oinkoink.board import (Board, BoardBatch, decode_records,
+                            encode_boards, encode_records,
+                            generate_positions, iterate_positions,
+                            load_positions, make_random_ips, save_positions)
+from oinkoink.perft import perft
 from oinkoink.utils import Result
 
 import pytest
 
 import numpy as np
 
+from copy import copy
+import copyreg
+import pickle
+
 
 # Board tests
 pieces_1 = [
@@ -223,7 +231,9 @@ def test_valid_moves():
     board_ = Board.from_pieces(o_pieces=o_pieces,
                                x_pieces=x_pieces)
 
-    assert board_.valid_moves == set([6])
+    # the last empty cell can't complete 4 in a row, so it is a dead draw
+    assert board_.result == Result.draw
+    assert board_.valid_moves == set()
 
     o_pieces = np.array(
         [[0, 0, 0, 0, 0, 0, 0],
@@ -245,3 +255,407 @@ def test_valid_moves():
                                x_pieces=x_pieces)
 
     assert board_.valid_moves == set([0, 1, 2, 4, 5, 6])
+
+
+def test_make_move_matches_from_pieces():
+    board_ = Board()
+    for move in [3, 3, 4, 2, 0, 6, 6]:
+        board_.make_move(move)
+
+    o_pieces = np.array(
+        [[0, 0, 0, 0, 0, 0, 0],
+         [0, 0, 0, 0, 0, 0, 0],
+         [0, 0, 0, 0, 0, 0, 0],
+         [0, 0, 0, 0, 0, 0, 0],
+         [0, 0, 0, 0, 0, 0, 1],
+         [1, 0, 0, 1, 1, 0, 0]], dtype=np.bool_)
+
+    x_pieces = np.array(
+        [[0, 0, 0, 0, 0, 0, 0],
+         [0, 0, 0, 0, 0, 0, 0],
+         [0, 0, 0, 0, 0, 0, 0],
+         [0, 0, 0, 0, 0, 0, 0],
+         [0, 0, 0, 1, 0, 0, 0],
+         [0, 0, 1, 0, 0, 0, 1]], dtype=np.bool_)
+
+    other = Board.from_pieces(o_pieces=o_pieces,
+                              x_pieces=x_pieces)
+
+    assert board_ == other
+    assert hash(board_) == hash(other)
+    assert board_.age == other.age == 7
+    assert board_.height == other.height
+    assert np.array_equal(board_.o_pieces, o_pieces)
+    assert np.array_equal(board_.x_pieces, x_pieces)
+
+
+def test_copy_and_fliplr():
+    board_ = Board()
+    for move in [0, 1, 0, 1, 0, 1]:
+        board_.make_move(move)
+
+    board_copy = copy(board_)
+    assert board_.make_move(0) == Result.o_win
+    assert board_copy.result is None
+    assert board_copy.valid_moves == set(range(7))
+
+    flipped = board_copy.create_fliplr()
+    assert np.array_equal(flipped.o_pieces, np.fliplr(board_copy.o_pieces))
+    assert np.array_equal(flipped.x_pieces, np.fliplr(board_copy.x_pieces))
+    assert flipped.make_move(6) == Result.o_win
+    assert not flipped.symmetrical
+    assert Board().symmetrical
+
+
+def test_board_batch_matches_board():
+    rng = np.random.default_rng(0)
+    boards = [Board() for _ in range(50)]
+    batch = BoardBatch.from_boards(boards)
+
+    while not all(b.result is not None for b in boards):
+        valid = batch.valid_moves
+        moves = []
+        for board_, batch_valid in zip(boards, valid):
+            assert set(np.flatnonzero(batch_valid)) == board_.valid_moves
+            if board_.result is None:
+                move = rng.choice(list(board_.valid_moves))
+                board_.make_move(move)
+            else:
+                move = -1
+            moves.append(move)
+        batch.make_move(moves)
+
+        assert batch.to_boards() == boards
+        assert np.array_equal(batch.to_array(),
+                              np.stack([b.to_array() for b in boards]))
+    assert [Result(r) for r in batch.result] == [b.result for b in boards]
+
+
+def test_board_batch_full_column():
+    batch = BoardBatch(2)
+    for _ in range(6):
+        batch.make_move([0, 1])
+    with pytest.raises(ValueError):
+        batch.make_move([0, 2])
+
+
+def test_encode_boards():
+    boards = [Board.from_pieces(o_pieces=p1, x_pieces=p2)
+              for p1, p2 in zip(pieces_1, pieces_2)]
+    expected = np.stack([np.stack([np.full((6, 7), b.age % 2 == 0), p1, p2])
+                         for b, p1, p2 in zip(boards, pieces_1, pieces_2)])
+
+    encoded = encode_boards(boards)
+    assert encoded.dtype == np.float32
+    assert np.array_equal(encoded, expected)
+
+    out = np.full((len(boards), 3, 6, 7), 7.0, dtype=np.float32)
+    assert encode_boards(boards, out=out) is out
+    assert np.array_equal(out, expected)
+
+
+def test_keys():
+    board_ = Board()
+    keys = set()
+    for move in [3, 3, 4, 2, 0, 6, 6, 1, 1]:
+        board_.make_move(move)
+        assert board_.key == board_.position + board_.mask
+        assert board_.key not in keys
+        keys.add(board_.key)
+
+    flipped = board_.create_fliplr()
+    assert flipped.key != board_.key
+    assert flipped.canonical_key == board_.canonical_key
+    assert board_.canonical_key in (board_.key, flipped.key)
+
+    # same position reached by different move orders
+    board_1, board_2 = Board(), Board()
+    for move in [0, 1, 2]:
+        board_1.make_move(move)
+    for move in [2, 1, 0]:
+        board_2.make_move(move)
+    assert board_1 == board_2
+    # same mask, pieces swapped between players
+    board_1, board_2 = Board(), Board()
+    board_1.make_move(0)
+    board_1.make_move(1)
+    board_2.make_move(1)
+    board_2.make_move(0)
+    assert board_1.mask == board_2.mask
+    assert board_1.key != board_2.key
+
+
+def test_unmake_move():
+    rng = np.random.default_rng(1)
+    for _ in range(20):
+        board_ = Board()
+        history = [copy(board_)]
+        moves = []
+        while board_.result is None:
+            move = rng.choice(list(board_.valid_moves))
+            board_.make_move(move)
+            history.append(copy(board_))
+            moves.append(move)
+        restored = copy(board_)
+        for move, previous in zip(reversed(moves), reversed(history[:-1])):
+            board_.unmake_move(move)
+            restored.unmake_move(move, previous.windows)
+            for undone in (board_, restored):
+                assert undone == previous
+                assert undone.age == previous.age
+                assert undone.windows == previous.windows
+                assert undone.result is None
+
+
+def test_move_stack():
+    board_ = Board()
+    board_.make_move(3)
+    before = copy(board_)
+    with board_.move_stack(3, 4) as moved:
+        assert moved is board_
+        assert board_.age == 3
+        assert board_.valid_moves == set(range(7))
+    assert board_ == before
+    assert board_.age == 1
+
+
+def brute_force_wins(board_):
+    wins = set()
+    for move in board_.valid_moves:
+        with board_.move_stack(move):
+            if board_.result is not None and board_.result != Result.draw:
+                wins.add(move)
+    return wins
+
+
+def test_threats():
+    rng = np.random.default_rng(2)
+    for _ in range(200):
+        board_ = Board()
+        while board_.result is None:
+            wins = brute_force_wins(board_)
+            assert board_.winning_moves() == wins
+
+            non_losing = set(wins)
+            for move in board_.valid_moves - wins:
+                with board_.move_stack(move):
+                    if not brute_force_wins(board_):
+                        non_losing.add(move)
+            assert board_.non_losing_moves() == non_losing
+
+            forced = board_.forced_move()
+            if wins:
+                assert forced in wins
+            elif len(non_losing) == 1:
+                assert forced in non_losing
+            else:
+                assert forced is None
+
+            board_.make_move(rng.choice(list(board_.valid_moves)))
+
+
+def test_opponent_threats():
+    board_ = Board()
+    for move in [0, 6, 1, 6, 2]:
+        board_.make_move(move)
+    assert board_.opponent_threats() == set([3])
+    assert board_.non_losing_moves() == set([3])
+    assert board_.forced_move() == 3
+    board_.make_move(5)
+    assert board_.winning_moves() == set([3])
+    assert board_.forced_move() == 3
+
+
+def test_open_windows():
+    rng = np.random.default_rng(3)
+    for _ in range(100):
+        board_ = Board()
+        while board_.result is None:
+            board_.make_move(rng.choice(list(board_.valid_moves)))
+            fresh = copy(board_)
+            fresh._reset_windows()
+            assert board_.windows == fresh.windows
+        if board_.result == Result.draw:
+            assert board_.windows == 0
+
+
+def brute_force_positions(board_, plies, positions):
+    if plies == 0:
+        if board_.result is None:
+            positions.add(board_.key)
+        return
+    for move in board_.valid_moves:
+        with board_.move_stack(move):
+            brute_force_positions(board_, plies - 1, positions)
+
+
+@pytest.mark.parametrize("plies", [0, 1, 4, 6])
+def test_generate_positions(plies):
+    expected = set()
+    brute_force_positions(Board(), plies, expected)
+
+    keys = generate_positions(plies)
+    assert list(keys) == sorted(expected)
+    assert make_random_ips(plies) == set(Board.from_key(k) for k in expected)
+
+    mirrored = [b.key for b in iterate_positions(plies, mirror=True)]
+    assert mirrored == sorted(set(Board.from_key(k).canonical_key
+                                  for k in expected))
+
+
+@pytest.mark.parametrize("mirror", [False, True])
+def test_generate_positions_processes(monkeypatch, mirror):
+    # small enough that the pool expands every ply after the second
+    monkeypatch.setattr('oinkoink.board.PARALLEL_FRONTIER', 10)
+    keys = generate_positions(5, mirror, processes=3)
+    assert list(keys) == list(generate_positions(5, mirror))
+
+
+def test_from_key():
+    board_ = Board()
+    for move in [3, 3, 4, 2, 0, 6, 6, 1, 1, 1, 1, 1, 1]:
+        board_.make_move(move)
+        other = Board.from_key(board_.key)
+        assert other == board_
+        assert (other.position, other.mask, other.age, other.windows) == \
+            (board_.position, board_.mask, board_.age, board_.windows)
+
+
+def test_save_positions(tmp_path):
+    keys = generate_positions(3, mirror=True)
+    file_name = str(tmp_path / 'positions.npy')
+    save_positions(file_name, keys)
+    loaded = load_positions(file_name)
+    assert loaded.dtype == np.uint64
+    assert np.array_equal(loaded, keys)
+
+
+def test_records():
+    boards = [Board.from_pieces(o_pieces=p1, x_pieces=p2)
+              for p1, p2 in zip(pieces_1, pieces_2)]
+    assert all(len(b.to_record()) == 16 for b in boards)
+
+    for board_, other in zip(boards, decode_records(encode_records(boards))):
+        assert other == board_
+        assert other.age == board_.age
+        assert other.result == board_.result
+
+    unpickled = pickle.loads(pickle.dumps(boards))
+    assert unpickled == boards
+    assert [b.result for b in unpickled] == [b.result for b in boards]
+
+
+class OldBoard():
+    """Pickles as the Board before __slots__ did, its __dict__ the state"""
+    def __init__(self, state):
+        self.state = state
+
+    def __reduce__(self):
+        return copyreg._reconstructor, (Board, object, None), self.state
+
+
+def test_old_pickles():
+    # Board.from_moves('445317') as pickled by the old Board
+    state = {'color': np.array([270532609, 4398050721792]),
+             'age': 6,
+             'height': np.array([1, 7, 15, 23, 29, 35, 43]),
+             'result': None}
+    board_ = pickle.loads(pickle.dumps(OldBoard(state)))
+    expected = Board.from_moves('445317')
+    assert board_ == expected
+    assert (board_.position, board_.mask, board_.age, board_.windows,
+            board_.result) == (expected.position, expected.mask,
+                               expected.age, expected.windows, None)
+
+
+def test_from_moves():
+    board = Board.from_moves('4453')
+    expected = Board()
+    for move in [3, 3, 4, 2]:
+        expected.make_move(move)
+    assert board == expected
+    assert board.age == 4
+
+    # o wins vertically, then no more moves may be played
+    assert Board.from_moves('1212121').result == Result.o_win
+    with pytest.raises(ValueError):
+        Board.from_moves('12121212')
+    with pytest.raises(ValueError):
+        Board.from_moves('1111111')
+    with pytest.raises(ValueError):
+        Board.from_moves('48')
+
+    strings = ['', '4453', '1212121', '444444', '7654321']
+    batch = BoardBatch.from_moves(strings)
+    boards = [Board.from_moves(m) for m in strings]
+    assert batch.to_boards() == boards
+    np.testing.assert_array_equal(batch.age, [b.age for b in boards])
+    assert [b.result for b in batch.to_boards()] == \
+        [b.result for b in boards]
+    with pytest.raises(ValueError):
+        BoardBatch.from_moves(['12121212'])
+
+
+def test_from_uci():
+    def uci_row(board, value):
+        o_pieces, x_pieces = np.flipud(board.o_pieces), \
+            np.flipud(board.x_pieces)
+        cells = ['x' if o_pieces[r, c] else 'o' if x_pieces[r, c] else 'b'
+                 for c in range(7) for r in range(6)]
+        return ','.join(cells) + ',' + value
+
+    boards = [Board.from_moves(m) for m in ['33243546', '44444455', '']]
+    lines = [uci_row(b, v) for b, v in zip(boards, ['win', 'loss', 'draw'])]
+    batch, values = BoardBatch.from_uci(lines)
+    assert batch.to_boards() == boards
+    np.testing.assert_array_equal(batch.age, [8, 8, 0])
+    np.testing.assert_array_equal(values, [1.0, 0.0, 0.5])
+
+
+def test_batch_fliplr():
+    boards = [Board.from_moves(m) for m in ['', '4', '1', '3324', '121212']]
+    batch = BoardBatch.from_boards(boards)
+    flipped = batch.create_fliplr()
+    assert flipped.to_boards() == [b.create_fliplr() for b in boards]
+    np.testing.assert_array_equal(flipped.age, batch.age)
+    np.testing.assert_array_equal(batch.symmetrical,
+                                  [b.symmetrical for b in boards])
+    np.testing.assert_array_equal(
+        flipped.to_array(), encode_boards(boards)[..., ::-1])
+
+
+@pytest.mark.parametrize('unique', [False, True])
+def test_perft(unique):
+    for depth in range(6):
+        result = perft(depth, unique=unique)
+        assert result.leaves == result.expected(unique)
+        assert result.terminal == 0
+
+    # the first wins come at 7 plies: o plays 4 into a column x avoids
+    board = Board.from_moves('121212')
+    result = perft(1, board)
+    assert (result.leaves, result.terminal, result.nodes) == (7, 1, 7)
+    assert perft(2, board).leaves == 6 * 7
+    assert perft(2, board, unique=True).leaves == 6 * 7
+
+
+def test_children():
+    rng = np.random.default_rng(3)
+    for _ in range(30):
+        board_ = Board()
+        while board_.result is None:
+            children = board_.children()
+            assert [c[0] for c in children] == sorted(board_.valid_moves)
+            for move, key, win, draw in children:
+                expected = copy(board_)
+                expected.make_move(move)
+                assert key == expected.key
+                assert win == (expected.result in (Result.o_win,
+                                                   Result.x_win))
+                assert draw == (expected.result == Result.draw)
+                child = board_.child(move, win, draw)
+                assert child == expected
+                assert (child.age, child.windows, child.result) == \
+                    (expected.age, expected.windows, expected.result)
+            board_.make_move(int(rng.choice(sorted(board_.valid_moves))))
+        assert board_.children() == []
@@ -0,0 +1,91 @@
+from oinkoink.board import Board
+from oinkoink.book import OpeningBook, build_book
+import oinkoink.evaluators as evaluators
+from oinkoink.game import Game
+from oinkoink.grid_search import GridSearch
+from oinkoink.mcts import MCTS, MCTSConfig
+
+import numpy as np
+import pytest
+
+
+class HashSolver():
+    """Stands in for Solver, which is too slow to solve whole plies here.
+    Gives a position and its mirror image the same made up score"""
+    def solve(self, board, weak=False):
+        return board.canonical_key % 7 - 3
+
+
+def test_build_book(tmp_path):
+    book = build_book(4, solver=HashSolver())
+    assert list(book.keys) == sorted(book.keys)
+    # positions at 0-4 plies, counting mirror images once
+    assert len(book) == 1 + 4 + 25 + 121 + 568
+
+    board = Board.from_moves('4433')
+    assert book.get(board) == HashSolver().solve(board)
+    assert book.get(Board.from_moves('4455')) == book.get(board)
+    assert book.get(Board.from_moves('44333')) is None
+    assert Board() in book
+
+    for moves in ['', '4', '12', '344']:
+        board = Board.from_moves(moves)
+        scores = book.analyze(board)
+        expected = [None if m not in board.valid_moves else
+                    -book.get(Board.from_moves(moves + str(m + 1)))
+                    for m in range(7)]
+        assert scores == expected
+        assert book.get(board) == max(s for s in scores if s is not None)
+    assert book.analyze(Board.from_moves('4433')) is None
+
+    book.save(tmp_path / 'book')
+    loaded = OpeningBook.load(tmp_path / 'book')
+    assert isinstance(loaded.keys, np.memmap)
+    assert np.array_equal(loaded.keys, book.keys)
+    assert np.array_equal(loaded.scores, book.scores)
+
+    with pytest.raises(ValueError):
+        build_book(4, processes=2, solver=HashSolver())
+
+
+def test_book_weak():
+    book = build_book(2, weak=True, solver=HashSolver())
+    assert set(book.scores) <= {-1, 0, 1}
+
+
+def test_players_use_book():
+    book = build_book(2, solver=HashSolver())
+    scores = book.analyze(Board())
+    best = max(s for s in scores if s is not None)
+
+    for player in [MCTS('mcts', MCTSConfig(simulations=2),
+                        evaluators.Evaluator(
+                            evaluators.evaluate_centre_with_prior),
+                        book),
+                   GridSearch('grid', 1,
+                              evaluators.Evaluator(
+                                  evaluators.evaluate_centre),
+                              book)]:
+        board = Board()
+        move, value, tree = player.make_move(board)
+        assert scores[move] == best
+        assert board.age == 1
+        assert len(tree.root.children) == 7
+
+        # out of the book, the player searches as before
+        board = Board.from_moves('4433')
+        player.make_move(board)
+        assert board.age == 5
+
+
+def test_displayed_game_with_book():
+    book = build_book(2, solver=HashSolver())
+    players = [MCTS(name, MCTSConfig(simulations=2),
+                    evaluators.Evaluator(
+                        evaluators.evaluate_centre_with_prior),
+                    book)
+               for name in ['o', 'x']]
+    # a displayed game prints each tree's policy, book moves included
+    game = Game(True, players[0], players[1], Board())
+    assert game.play() is not None
+    assert len(game.move_history) > 2
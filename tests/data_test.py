@@ -0,0 +1,18 @@
+from oinkoink.board import Board
+from oinkoink.neural.pytorch.data import native_to_pytorch
+
+import numpy as np
+import torch
+
+
+def test_native_to_pytorch_fliplr():
+    boards = [Board.from_moves(m) for m in ['', '1', '3324']]
+    priors = [np.arange(7) / 21.0 for _ in boards]
+    board_t, value_t, prior_t = native_to_pytorch(boards, [0.0, 0.5, 1.0],
+                                                  priors, add_fliplr=True)
+    flipped = native_to_pytorch([b.create_fliplr() for b in boards],
+                                [0.0, 0.5, 1.0])[0]
+    assert len(boards) == 3
+    assert torch.equal(board_t[3:], flipped)
+    assert torch.equal(value_t, torch.FloatTensor([0.0, 0.5, 1.0] * 2))
+    assert torch.equal(prior_t[3:], prior_t[:3].flip(-1))
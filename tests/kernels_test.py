@@ -0,0 +1,82 @@
+from oinkoink import kernels
+from oinkoink.board import (Board, BoardBatch, check_terminal_positions,
+                            has_open_windows, mirror_bitboards, open_windows,
+                            popcount, popcounts)
+
+import pytest
+
+import numpy as np
+
+from copy import copy
+
+
+def random_boards(n, seed=0):
+    rng = np.random.default_rng(seed)
+    boards = []
+    for _ in range(n):
+        board = Board()
+        while board.result is None:
+            boards.append(copy(board))
+            board.make_move(int(rng.choice(sorted(board.valid_moves))))
+        boards.append(board)
+    return boards
+
+
+def test_scalar_kernels():
+    for board in random_boards(30):
+        o_color, x_color = board.color
+        other = board.position ^ board.mask
+        assert kernels.is_win(other) == board._check_terminal_position(other)
+        assert kernels.has_open_window(o_color) == bool(open_windows(o_color))
+        assert kernels.popcount(board.mask) == popcount(board.mask) == \
+            board.age
+        assert kernels.mirror(board.key) == board.flip_color(board.key)
+        for move in range(7):
+            assert kernels.is_playable(board.mask, move) == \
+                board._isplayable(move)
+            if board.result is None and board._isplayable(move):
+                child = copy(board)
+                child.make_move(move)
+                assert kernels.play(board.position, board.mask, move) == \
+                    (child.position, child.mask)
+
+
+@pytest.mark.parametrize('numba', [False, kernels.HAVE_NUMBA])
+def test_array_kernels(monkeypatch, numba):
+    monkeypatch.setattr(kernels, 'HAVE_NUMBA', numba)
+    boards = random_boards(30, seed=1)
+    pieces = np.array([b.position ^ b.mask for b in boards], dtype=np.uint64)
+    np.testing.assert_array_equal(
+        check_terminal_positions(pieces),
+        [b._check_terminal_position(b.position ^ b.mask) for b in boards])
+    np.testing.assert_array_equal(
+        has_open_windows(pieces),
+        [bool(open_windows(b.position ^ b.mask)) for b in boards])
+    np.testing.assert_array_equal(
+        mirror_bitboards(pieces),
+        [b.flip_color(b.position ^ b.mask) for b in boards])
+    np.testing.assert_array_equal(popcounts(pieces),
+                                  [popcount(int(p)) for p in pieces])
+
+
+@pytest.mark.parametrize('numba', [False, kernels.HAVE_NUMBA])
+def test_batch_kernels(monkeypatch, numba):
+    monkeypatch.setattr(kernels, 'HAVE_NUMBA', numba)
+    rng = np.random.default_rng(2)
+    batch = BoardBatch(50)
+    boards = [Board() for _ in range(50)]
+    while not batch.finished.all():
+        valid = batch.valid_moves
+        moves = np.array([rng.choice(np.flatnonzero(v)) if v.any() else 0
+                          for v in valid])
+        batch.make_move(moves)
+        for board, move in zip(boards, moves):
+            if board.result is None:
+                board.make_move(int(move))
+        assert batch.to_boards() == boards
+        assert [b.result for b in batch.to_boards()] == \
+            [b.result for b in boards]
+
+    batch = BoardBatch.from_moves(['111111'])
+    with pytest.raises(ValueError):
+        batch.make_move([0])
@@ -1,7 +1,10 @@
 from oinkoink.board import Board
 import oinkoink.evaluators as evaluators
-from oinkoink.grid_search import GridSearch
+from oinkoink.game import Game
+from oinkoink.grid_search import GridSearch, terminal_value
 from oinkoink.mcts import MCTS, MCTSConfig
+from oinkoink.solver import Solver
+from oinkoink.utils import Side, value_to_side
 
 import anytree
 import pytest
@@ -179,6 +182,134 @@ def test_mcts_next_move(n, board, plies, ans):
     return
 
 
+def minimax(board, plies, evaluator):
+    """GridSearch without pruning"""
+    if board.result is not None:
+        return terminal_value(board)
+    if plies == 0:
+        return evaluator(board)
+    values = [minimax(board.child(move, win, draw), plies - 1, evaluator)
+              for move, _, win, draw in board.children()]
+    return max(values) if board.player_to_move == Side.o else min(values)
+
+
+@pytest.mark.parametrize('plies', [1, 2, 4])
+def test_grid_search_matches_minimax(plies):
+    rng = np.random.default_rng(plies)
+    evaluator = evaluators.Evaluator(evaluators.evaluate_centre)
+    computer = GridSearch('grid', plies, evaluator)
+    for _ in range(10):
+        board = Board()
+        for _ in range(int(rng.integers(0, 20))):
+            moves = [move for move, _, win, draw in board.children()
+                     if not win and not draw]
+            board.make_move(int(rng.choice(moves)))
+        side = board.player_to_move
+        values = {}
+        for move, _, win, draw in board.children():
+            child = board.child(move, win, draw)
+            values[move] = child.result.value if child.result is not None \
+                else minimax(child, plies - 1, evaluator)
+        # ties go to the highest column, as Tree.best_move
+        best = max(values, key=lambda m: (value_to_side(values[m], side), m))
+
+        move, value, tree = computer.make_move(board)
+        assert move == best
+        assert value == values[best]
+        assert {c.name: c.data.absolute_value
+                for c in tree.root.children} == values
+
+
+def test_grid_search_budget():
+    board = Board.from_moves('4453')
+    evaluator = evaluators.Evaluator(evaluators.evaluate_centre)
+    fixed = GridSearch('fixed', 4, evaluator)
+    move, value, _ = fixed.make_move(copy(board))
+
+    deepening = GridSearch('deepening', 4, evaluator, max_nodes=10 ** 6)
+    assert deepening.make_move(copy(board))[:2] == (move, value)
+    assert deepening.depth == 4
+
+    for max_nodes in [0, 50, 500]:
+        deepening = GridSearch('deepening', 8, evaluator,
+                               max_nodes=max_nodes)
+        move, value, _ = deepening.make_move(copy(board))
+        assert 1 <= deepening.depth < 8
+        # the move of the deepest search that finished
+        fixed = GridSearch('fixed', deepening.depth, evaluator)
+        assert fixed.make_move(copy(board))[:2] == (move, value)
+
+    deepening = GridSearch('deepening', 8, evaluator, max_seconds=0.0)
+    deepening.make_move(copy(board))
+    assert deepening.depth == 1
+
+
+@pytest.mark.parametrize('prefetch_plies', [1, 2, 3])
+def test_grid_search_prefetch(prefetch_plies):
+    board = Board.from_moves('4453')
+    move, value, _ = GridSearch(
+        'grid', 3, evaluators.Evaluator(evaluators.evaluate_centre)
+    ).make_move(copy(board))
+
+    singles, batches = [], []
+
+    def evaluate(board):
+        singles.append(board.key)
+        return evaluators.evaluate_centre_with_prior(board)
+
+    def evaluate_batch(boards):
+        batches.append(len(boards))
+        return [evaluators.evaluate_centre_with_prior(b) for b in boards]
+
+    evaluator = evaluators.Evaluator(evaluate, mirror=True,
+                                     evaluate_batch_fn=evaluate_batch)
+    computer = GridSearch('grid', 3, evaluator,
+                          prefetch_plies=prefetch_plies)
+    assert computer.make_move(copy(board))[:2] == (move, value)
+    # every leaf came from a batch
+    assert singles == []
+    if prefetch_plies == 3:
+        assert len(batches) == 1
+
+
+@pytest.mark.parametrize('split_plies', [1, 2])
+def test_grid_search_processes(split_plies):
+    board = Board.from_moves('4453')
+    evaluator = evaluators.Evaluator(evaluators.evaluate_centre)
+    for plies in [1, 2, 4]:
+        move, value, tree = GridSearch('grid', plies,
+                                       evaluator).make_move(copy(board))
+        computer = GridSearch('grid', plies, evaluator, processes=2,
+                              split_plies=split_plies)
+        parallel_move, parallel_value, parallel_tree = \
+            computer.make_move(copy(board))
+        assert (parallel_move, parallel_value) == (move, value)
+        assert [c.data.absolute_value for c in parallel_tree.root.children] \
+            == [c.data.absolute_value for c in tree.root.children]
+
+    computer = GridSearch('grid', 8, evaluator, max_seconds=0.2,
+                          processes=2, split_plies=split_plies)
+    computer.make_move(copy(board))
+    assert computer.depth >= 1
+    # the pool only lasts the move, so the player can still be copied
+    assert copy(computer).processes == 2
+
+    with pytest.raises(ValueError):
+        GridSearch('grid', 8, evaluator, max_nodes=100, processes=2)
+    with pytest.raises(ValueError):
+        GridSearch('grid', 8, evaluator, processes=2, split_plies=3)
+
+
+@pytest.mark.parametrize('plies', [1, 2])
+def test_grid_search_displayed_game(plies):
+    players = [GridSearch(name, plies,
+                          evaluators.Evaluator(evaluators.evaluate_centre))
+               for name in ['o', 'x']]
+    # the display prints each tree's visit count policy
+    game = Game(True, players[0], players[1], Board())
+    assert game.play() is not None
+
+
 def test_multiple_moves():
     board = Board()
 
@@ -197,3 +328,128 @@ def test_multiple_moves():
     board.make_move(4)
 
     assert computer.make_move(board)[0] == 2
+
+
+def test_evaluator_mirror():
+    def evaluate_left(board):
+        prior = np.zeros((7,))
+        prior[min(board.valid_moves)] = 1.0
+        return board.age, prior
+
+    evaluator = evaluators.Evaluator(evaluate_left, mirror=True)
+    board = Board()
+    board.make_move(1)
+    flipped = board.create_fliplr()
+
+    value, prior = evaluator(board)
+    assert (value, prior[0]) == (1, 1.0)
+    value, prior = evaluator(flipped)
+    assert (value, prior[6]) == (1, 1.0)
+    assert len(evaluator.position_table) == 1
+
+    boards = [Board.from_moves(moves) for moves in ['12', '76', '1', '44']]
+    prefetched = evaluators.Evaluator(
+        evaluate_left, mirror=True,
+        evaluate_batch_fn=lambda boards: [evaluate_left(b) for b in boards])
+    prefetched.prefetch(boards, batch_size=2)
+    # '12' and '76' are mirror images
+    assert len(prefetched.position_table) == 3
+    # as if each board had been evaluated in turn
+    evaluator = evaluators.Evaluator(evaluate_left, mirror=True)
+    for board in boards:
+        evaluator(board)
+    for board in boards:
+        value, prior = prefetched(board)
+        expected_value, expected_prior = evaluator(board)
+        assert value == expected_value
+        assert (prior == expected_prior).all()
+
+
+def test_position_table():
+    calls = []
+
+    def counting_evaluate(board):
+        calls.append(board.key)
+        return evaluators.evaluate_centre(board)
+
+    evaluator = evaluators.Evaluator(counting_evaluate)
+    boards = [Board.from_moves(moves) for moves in ['', '4', '44', '443']]
+    for board in boards * 2:
+        evaluator(board)
+    assert len(calls) == 4
+    assert [len(b) for b in evaluator.position_table.buckets[:5]] == \
+        [1, 1, 1, 1, 0]
+
+    evaluator.release_below(2)
+    assert len(evaluator.position_table) == 2
+    for board in boards:
+        evaluator(board)
+    assert calls[4:] == [boards[0].key, boards[1].key]
+
+    evaluator = evaluators.Evaluator(evaluators.evaluate_centre_with_prior)
+    computer = MCTS('mcts_test', MCTSConfig(simulations=20), evaluator,
+                    release_positions=True)
+    board = Board()
+    for _ in range(3):
+        computer.make_move(board)
+    # the last search started at age 2
+    assert [len(b) for b in evaluator.position_table.buckets[:2]] == [0, 0]
+    assert evaluator.position_table.buckets[2]
+
+    # a second game sharing the table holds on to the plies from its root
+    other = MCTS('other', MCTSConfig(simulations=20), evaluator,
+                 release_positions=True)
+    other.make_move(Board.from_moves('4'))
+    for _ in range(2):
+        computer.make_move(board)
+    # the other game's root is at age 1
+    assert not evaluator.position_table.buckets[0]
+    assert evaluator.position_table.buckets[1]
+    evaluator.release_below(6, 'other')
+    # and now the first game's, at age 4
+    assert [len(b) for b in evaluator.position_table.buckets[:4]] == \
+        [0, 0, 0, 0]
+    assert evaluator.position_table.buckets[4]
+
+
+def test_mcts_solves_leaves():
+    rng = np.random.default_rng(0)
+    board = Board()
+    while board.age < 30:
+        moves = [move for move, _, win, draw in board.children()
+                 if not win and not draw]
+        board.make_move(int(rng.choice(moves)))
+
+    calls = []
+
+    def counting_evaluate(board):
+        calls.append(board.key)
+        return evaluators.evaluate_centre_with_prior(board)
+
+    scores = Solver(table_size=1021).analyze(board)
+    best = max(s for s in scores if s is not None)
+    for config, expect_solved in [(MCTSConfig(simulations=200), False),
+                                  (MCTSConfig(simulations=200,
+                                              solve_from_age=31), True)]:
+        del calls[:]
+        computer = MCTS("mcts_test", config,
+                        evaluators.Evaluator(counting_evaluate))
+        move, _, tree = computer.make_move(copy(board))
+        solved = [c for c in tree.root.children
+                  if c.data.solved_value is not None]
+        finished = [c for c in tree.root.children
+                    if c.data.board.result is not None]
+        if expect_solved:
+            # every child is solved, so only the root goes to the evaluator
+            assert len(solved) + len(finished) == len(tree.root.children)
+            assert len(calls) == 1
+            assert all(not c.children for c in solved)
+            assert np.sign(scores[move]) == np.sign(best)
+        else:
+            assert not solved
+            assert len(calls) > 1
+
+    # a new game releases the last one's solves
+    assert len(computer.solved) > 0
+    computer.make_move(Board())
+    assert len(computer.solved) == 0
@@ -0,0 +1,187 @@
+from oinkoink import kernels
+from oinkoink.board import Board, SIZE
+from oinkoink.game import Game
+from oinkoink.solver import (MappedTranspositionTable, ParallelSolver,
+                             SharedTranspositionTable, Solver, SolverPlayer,
+                             TABLE_MAGIC, evaluate_solver,
+                             evaluate_solver_with_prior)
+from oinkoink.utils import Result, Side
+
+import pytest
+
+import numpy as np
+import os
+import struct
+
+
+def brute_force_score(board):
+    best = None
+    for move, _, win, draw in board.children():
+        if win:
+            return (SIZE + 1 - board.age) // 2
+        score = 0 if draw else \
+            -brute_force_score(board.child(move, win, draw))
+        best = score if best is None else max(best, score)
+    return 0 if best is None else best
+
+
+def endgames(n, age, seed=0):
+    rng = np.random.default_rng(seed)
+    boards = []
+    while len(boards) < n:
+        board = Board()
+        while board.result is None and board.age < age:
+            board.make_move(int(rng.choice(sorted(board.valid_moves))))
+        if board.result is None:
+            boards.append(board)
+    return boards
+
+
+@pytest.mark.parametrize('numba', [False, kernels.HAVE_NUMBA])
+def test_solve(monkeypatch, numba):
+    monkeypatch.setattr(kernels, 'HAVE_NUMBA', numba)
+    solver = Solver(table_size=1021)
+    for board in endgames(20, 34):
+        score = brute_force_score(board)
+        assert solver.solve(board) == score
+        assert np.sign(solver.solve(board, weak=True)) == np.sign(score)
+
+        expected = [None] * 7
+        for move, _, win, draw in board.children():
+            expected[move] = (SIZE + 1 - board.age) // 2 if win else \
+                0 if draw else -brute_force_score(board.child(move, win, draw))
+        assert solver.analyze(board) == expected
+
+
+def test_solve_finished():
+    solver = Solver(table_size=1021)
+    won = Board.from_moves('1212121')
+    assert won.result == Result.o_win
+    assert solver.solve(won) == -((SIZE + 2 - 7) // 2)
+    # o can win straight away
+    assert solver.solve(Board.from_moves('121212')) == (SIZE + 1 - 6) // 2
+
+
+def test_solver_player():
+    player = SolverPlayer('solver', Solver(table_size=1021))
+    for board in endgames(10, 36, seed=1):
+        scores = player.solver.analyze(board)
+        winning = board.winning_moves()
+        side = board.player_to_move
+        n_children = len(board.children())
+        move, value, tree = player.make_move(board)
+        assert scores[move] == max(s for s in scores if s is not None)
+        assert len(tree.root.children) == n_children
+        if winning:
+            assert move in winning
+            assert value == 1.0 if side == Side.o else value == 0.0
+            assert board.result is not None
+
+
+    board = endgames(1, 36, seed=2)[0]
+    game = Game(True, player, player, board)
+    assert game.play() is not None
+
+
+def test_evaluate_solver():
+    solver = Solver(table_size=1021)
+    # o can win straight away
+    board = Board.from_moves('121212')
+    assert evaluate_solver(board, solver) == 1.0
+    for board in endgames(5, 36, seed=2):
+        value, prior = evaluate_solver_with_prior(board, solver)
+        assert value == evaluate_solver(board, solver)
+        assert np.isclose(np.sum(prior), 1.0)
+        assert all(prior[move] == 0.0 for move in range(7)
+                   if move not in board.valid_moves)
+
+
+@pytest.mark.parametrize('numba', [False, kernels.HAVE_NUMBA])
+def test_solve_max_nodes(monkeypatch, numba):
+    monkeypatch.setattr(kernels, 'HAVE_NUMBA', numba)
+    solver = Solver(table_size=1021)
+    for board in endgames(5, 36, seed=4):
+        score = brute_force_score(board)
+        if solver.solve(board, max_nodes=1) is None:
+            # giving up mustn't leave wrong bounds in the table
+            assert solver.solve(board) == score
+        assert solver.solve(board, max_nodes=100000) == score
+
+
+def test_shared_table():
+    table = SharedTranspositionTable(1021)
+    attached = SharedTranspositionTable(1021, table.name)
+    key = Board.from_moves('4455').key
+    table.put(key, 5)
+    assert attached.get(key) == 5
+    # a colliding key overwrites the entry
+    attached.put(key + 1021, 3)
+    assert table.get(key) == 0
+    assert table.get(key + 1021) == 3
+    attached.close()
+    table.close()
+
+
+@pytest.mark.parametrize('numba', [False, kernels.HAVE_NUMBA])
+def test_parallel_solve(monkeypatch, numba):
+    monkeypatch.setattr(kernels, 'HAVE_NUMBA', numba)
+    with ParallelSolver(processes=3, table_size=1021) as solver:
+        assert len(set(solver.orders)) == 3
+        for board in endgames(5, 32, seed=5):
+            assert solver.solve(board) == brute_force_score(board)
+        assert solver.nodes > 0
+
+
+def test_parallel_solve_failures(monkeypatch):
+    def fail(self, board, weak=False, max_nodes=None):
+        raise ValueError('broken')
+
+    board = endgames(1, 32, seed=5)[0]
+    with ParallelSolver(processes=2, table_size=1021) as solver:
+        monkeypatch.setattr(Solver, 'solve', fail)
+        with pytest.raises(RuntimeError, match='broken'):
+            solver.solve(board)
+        # killed workers send nothing at all
+        monkeypatch.setattr(Solver, 'solve', lambda *args: os._exit(1))
+        with pytest.raises(RuntimeError, match='exit codes'):
+            solver.solve(board)
+
+
+def test_mapped_table(tmp_path):
+    path = str(tmp_path / 'table.bin')
+    board = endgames(1, 26, seed=7)[0]
+    table = MappedTranspositionTable(path, 1021)
+    solver = Solver(table=table)
+    score = solver.solve(board)
+    cold_nodes = solver.nodes
+    key = Board.from_moves('4455').key
+    table.put(key, 5)
+    table.close()
+
+    # the next run starts warm
+    table = MappedTranspositionTable(path)
+    assert table.size == 1021
+    assert table.get(key) == 5
+    solver = Solver(table=table)
+    assert solver.solve(board) == score
+    assert solver.nodes < cold_nodes
+    table.close()
+
+    # resizing keeps the entries that still fit
+    table = MappedTranspositionTable(path, 509)
+    assert table.get(key) == 5
+    table.close()
+
+    # another version starts afresh
+    with open(path, 'r+b') as f:
+        f.write(struct.pack('<4sI', TABLE_MAGIC, 0))
+    table = MappedTranspositionTable(path)
+    assert table.get(key) == 0
+    table.close()
+
+    with open(path, 'wb') as f:
+        f.write(b'not a table')
+    with pytest.raises(ValueError):
+        MappedTranspositionTable(path)
+    with pytest.raises(ValueError):
+        MappedTranspositionTable(str(tmp_path / 'empty.bin'), 0)
@@ -0,0 +1,36 @@
+from oinkoink.board import Board
+import oinkoink.evaluators as evaluators
+from oinkoink.grid_search import GridSearch
+from oinkoink.solver import Solver
+from oinkoink.utils import Result
+
+from oinkoink.neural.training_game import Adjudicator, training_game
+
+
+def test_adjudication():
+    player = GridSearch('grid', 2,
+                        evaluators.Evaluator(evaluators.evaluate_centre))
+    played = training_game(player)
+    assert not played.adjudicated
+    assert played.plies_adjudicated == 0
+
+    age = len(played.moves) - 5
+    adjudicated = training_game(player, Adjudicator(age, 1000000,
+                                                    Solver(table_size=1021)))
+    assert adjudicated.adjudicated
+    assert len(adjudicated.moves) == age
+    assert adjudicated.plies_adjudicated == 42 - age
+    assert adjudicated.plies_saved == 0
+    # the games are the same up to adjudication, as the player is
+    # deterministic
+    assert adjudicated.moves == played.moves[:age]
+    assert adjudicated.data.values == [adjudicated.result.value] * age
+
+
+def test_adjudicator():
+    adjudicator = Adjudicator(0, 100000, Solver(table_size=1021))
+    # o to move and wins straight away
+    assert adjudicator(Board.from_moves('121212')) == Result.o_win
+    # x to move, but o has two threats
+    assert adjudicator(Board.from_moves('44335')) == Result.o_win
+    assert Adjudicator(0, 1, Solver(table_size=1021))(Board()) is None